@@ -0,0 +1,225 @@
+from flask import Blueprint, jsonify, request
+from database import engine, logging
+from datetime import datetime
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+archive_routes = Blueprint('archive', __name__)
+
+DATABASE_FILE = engine.url.database
+ARCHIVE_PATH = os.environ.get('ARCHIVE_PATH', os.path.join(os.path.dirname(DATABASE_FILE), 'sales-archive.db'))
+# Rows moved per transaction; the write lock is released between batches and
+# we sleep briefly so tills can get their sales in while an archive runs.
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 2000))
+ARCHIVE_BATCH_SLEEP = float(os.environ.get('ARCHIVE_BATCH_SLEEP', 0.05))
+
+SALES_COLUMNS = 'id, item_name, quantity, buyer_name, timestamp, previous_stock, new_stock'
+
+
+def connect():
+    """A connection to the live database with the archive attached as `archive`"""
+    connection = sqlite3.connect(DATABASE_FILE, timeout=30, isolation_level=None)
+    connection.execute("PRAGMA busy_timeout = 30000")
+    connection.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_PATH,))
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS archive.sales (
+            id INTEGER PRIMARY KEY,
+            item_name VARCHAR,
+            quantity INTEGER,
+            buyer_name VARCHAR,
+            timestamp DATETIME,
+            previous_stock INTEGER,
+            new_stock INTEGER
+        )
+    """)
+    connection.execute("CREATE INDEX IF NOT EXISTS archive.ix_sales_timestamp ON sales (timestamp)")
+    return connection
+
+
+def archived_max_id():
+    """Highest sale id in the archive database, or 0 if there is none yet"""
+    if not os.path.exists(ARCHIVE_PATH):
+        return 0
+    connection = sqlite3.connect(ARCHIVE_PATH)
+    try:
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sales'"
+        ).fetchone()
+        if not exists:
+            return 0
+        return connection.execute("SELECT coalesce(max(id), 0) FROM sales").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def archive_status(connection=None):
+    close = connection is None
+    connection = connection or connect()
+    try:
+        state = connection.execute(
+            "SELECT archived_before, archived_rows FROM main.sales_archive_state WHERE id = 1"
+        ).fetchone()
+        return {
+            'archived_before': state[0] if state else None,
+            'archived_rows': state[1] if state else 0,
+            'archive_path': ARCHIVE_PATH
+        }
+    finally:
+        if close:
+            connection.close()
+
+
+def archive_sales(before, batch_size=ARCHIVE_BATCH_SIZE, pause=ARCHIVE_BATCH_SLEEP):
+    """
+    Move sales made before the day `before` (YYYY-MM-DD) into the archive
+    database, one id range per transaction. Each batch copies and deletes its
+    rows together, so an interrupted run loses nothing and simply picks up
+    from the oldest remaining row when started again. The daily rollup is
+    left alone, so reports still cover archived days.
+    Returns the number of sales moved.
+    """
+    datetime.strptime(before, '%Y-%m-%d')
+    connection = connect()
+    try:
+        # Record the cutoff first so rollup checks stop expecting these days in the ledger
+        connection.execute("""
+            INSERT INTO main.sales_archive_state (id, archived_before, archived_rows) VALUES (1, ?, 0)
+            ON CONFLICT (id) DO UPDATE SET archived_before = max(archived_before, excluded.archived_before)
+        """, (before,))
+
+        moved = 0
+        last_id = 0
+        started = time.perf_counter()
+        while True:
+            ids = [row[0] for row in connection.execute(
+                "SELECT id FROM main.sales WHERE id > ? AND timestamp < ? ORDER BY id LIMIT ?",
+                (last_id, before, batch_size)
+            )]
+            if not ids:
+                break
+            first_id, last_id = ids[0], ids[-1]
+
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # A plain INSERT: an id already in the archive aborts the batch
+                # rather than letting the DELETE drop a row that was never copied
+                copied = connection.execute(f"""
+                    INSERT INTO archive.sales ({SALES_COLUMNS})
+                    SELECT {SALES_COLUMNS} FROM main.sales
+                    WHERE id BETWEEN ? AND ? AND timestamp < ?
+                """, (first_id, last_id, before)).rowcount
+                deleted = connection.execute(
+                    "DELETE FROM main.sales WHERE id BETWEEN ? AND ? AND timestamp < ?",
+                    (first_id, last_id, before)
+                ).rowcount
+                if copied != deleted:
+                    raise RuntimeError(
+                        f"Archive batch {first_id}-{last_id} copied {copied} sales but would delete {deleted}"
+                    )
+                connection.execute(
+                    "UPDATE main.sales_archive_state SET archived_rows = archived_rows + ? WHERE id = 1",
+                    (deleted,)
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+            moved += deleted
+            logger.info(f"Archived {moved} sales (through id {last_id})")
+            if pause:
+                time.sleep(pause)
+
+        logger.info(f"Archived {moved} sales before {before} in {time.perf_counter() - started:.1f}s")
+        return moved
+    finally:
+        connection.close()
+
+
+class ArchiveJob:
+    """Runs one archive at a time on a background thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+        self.last_result = None
+        self.last_error = None
+
+    def start(self, before, batch_size=ARCHIVE_BATCH_SIZE):
+        """Start archiving; returns False if an archive is already running"""
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+        threading.Thread(target=self._run, args=(before, batch_size), name='sales-archive', daemon=True).start()
+        return True
+
+    def _run(self, before, batch_size):
+        try:
+            moved = archive_sales(before, batch_size)
+            self.last_result = {'before': before, 'moved': moved, 'finished': datetime.now().isoformat()}
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Sales archive failed: {e}")
+        finally:
+            self.running = False
+
+
+def init_archive_routes(job):
+    @archive_routes.route('', methods=['GET'])
+    def get_archive():
+        try:
+            status = archive_status()
+        except Exception as e:
+            return jsonify({'success': False, 'message': str(e)}), 500
+        return jsonify({
+            **status,
+            'running': job.running,
+            'last_result': job.last_result,
+            'last_error': job.last_error
+        })
+
+    @archive_routes.route('', methods=['POST'])
+    def start_archive():
+        data = request.get_json(silent=True) or {}
+        before = data.get('before')
+        try:
+            cutoff = datetime.strptime(before or '', '%Y-%m-%d')
+            batch_size = int(data.get('batch_size', ARCHIVE_BATCH_SIZE))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'before must be a YYYY-MM-DD date'}), 400
+        if cutoff > datetime.now():
+            return jsonify({'success': False, 'message': 'before must not be in the future'}), 400
+        if batch_size < 1:
+            return jsonify({'success': False, 'message': 'batch_size must be positive'}), 400
+        if not job.start(before, batch_size):
+            return jsonify({'success': False, 'message': 'An archive is already running'}), 409
+        return jsonify({'success': True, 'message': f'Archiving sales before {before}'}), 202
+
+    return archive_routes
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    try:
+        if command == 'run' and len(sys.argv) > 2:
+            batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else ARCHIVE_BATCH_SIZE
+            moved = archive_sales(sys.argv[2], batch_size)
+            print(f"Moved {moved} sales before {sys.argv[2]} to {ARCHIVE_PATH}")
+        elif command == 'status':
+            status = archive_status()
+            print(f"Sales before {status['archived_before']} archived "
+                  f"({status['archived_rows']} rows) in {status['archive_path']}")
+        else:
+            print("Usage: python archive.py [run <YYYY-MM-DD> [batch size]|status]")
+            sys.exit(2)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
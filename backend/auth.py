@@ -1,14 +1,162 @@
-from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-import jwt
+from flask import Blueprint, request, jsonify, g
+from collections import OrderedDict
+from functools import wraps
 import datetime
+import logging
+import os
+import secrets
+import threading
+import time
 from sqlalchemy.orm import Session
-from database import User
+from database import User, engine
+from hashing import HashingBusy, hash_password, verify_password, needs_rehash, record_login, login_metrics
+
+logger = logging.getLogger(__name__)
 
 auth_routes = Blueprint('auth', __name__)
-SECRET_KEY = 'your-secret-key'
+
+SECRET_KEY_FILE = os.environ.get(
+    'JWT_SECRET_KEY_FILE', os.path.join(os.path.dirname(engine.url.database), 'jwt-secret.key')
+)
+
+
+def load_secret_key(path=SECRET_KEY_FILE):
+    """
+    The key tokens are signed with: JWT_SECRET_KEY if set, otherwise a random
+    key generated on first start and kept next to the database, so each install
+    has its own and tokens survive restarts.
+    """
+    key = os.environ.get('JWT_SECRET_KEY')
+    if key:
+        if len(key.encode()) < 32:
+            logger.warning("JWT_SECRET_KEY is shorter than 32 bytes; HS256 wants at least 32")
+        return key
+    try:
+        # O_EXCL: if two processes start at once, only one key is ever written
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path) as key_file:
+            key = key_file.read().strip()
+        if key:
+            return key
+        raise RuntimeError(f"Token signing key file {path} is empty; delete it to generate a new key")
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, 'w') as key_file:
+        key_file.write(key)
+    logger.info(f"Generated a token signing key at {path}")
+    return key
+
+
+SECRET_KEY = load_secret_key()
+
+
+class TokenCache:
+    """Small LRU of already-verified tokens; an entry is only trusted until its exp"""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            claims = self._tokens.get(token)
+            if claims is None:
+                return None
+            if claims['exp'] <= time.time():
+                del self._tokens[token]
+                return None
+            self._tokens.move_to_end(token)
+            return claims
+
+    def put(self, token, claims):
+        with self._lock:
+            self._tokens[token] = claims
+            self._tokens.move_to_end(token)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+
+class RoleMap:
+    """
+    username -> role for every user, loaded with one query and kept until a user
+    is created or deleted. Lets a request be checked against the user's current
+    role (and existence) without a User query per request.
+    """
+
+    def __init__(self, get_db):
+        self._get_db = get_db
+        self._roles = None
+        self._lock = threading.Lock()
+
+    def get(self, username):
+        roles = self._roles
+        if roles is None:
+            with self._lock:
+                if self._roles is None:
+                    db = next(self._get_db())
+                    try:
+                        self._roles = dict(db.query(User.username, User.role).all())
+                    finally:
+                        db.close()
+                roles = self._roles
+        return roles.get(username)
+
+    def invalidate(self):
+        with self._lock:
+            self._roles = None
+
 
 def init_auth_routes(get_db):
+    token_cache = TokenCache()
+    role_map = RoleMap(get_db)
+
+    def authenticate(required_role=None):
+        """
+        Check the request's Bearer token and store the caller in g.current_user.
+        Returns an error response, or None if the request may proceed.
+        """
+        header = request.headers.get('Authorization', '')
+        if not header.startswith('Bearer '):
+            return jsonify({'message': 'Token is missing'}), 401
+        token = header[len('Bearer '):]
+
+        claims = token_cache.get(token)
+        if claims is None:
+            import jwt  # imported lazily to keep server startup fast
+
+            try:
+                claims = jwt.decode(token, SECRET_KEY, algorithms=['HS256'], options={'require': ['exp']})
+            except jwt.ExpiredSignatureError:
+                return jsonify({'message': 'Token has expired'}), 401
+            except jwt.InvalidTokenError:
+                return jsonify({'message': 'Token is invalid'}), 401
+            token_cache.put(token, claims)
+
+        role = role_map.get(claims.get('username'))
+        if role is None:
+            return jsonify({'message': 'User no longer exists'}), 401
+        if required_role and role != required_role:
+            return jsonify({'message': 'Insufficient permissions'}), 403
+
+        g.current_user = {'username': claims['username'], 'role': role}
+        return None
+
+    def token_required(f=None, role=None):
+        """Protect a route; use as @token_required or @token_required(role='admin')"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                error = authenticate(role)
+                if error is not None:
+                    return error
+                return view(*args, **kwargs)
+            return wrapper
+
+        return decorator(f) if f is not None else decorator
+
+    token_required.authenticate = authenticate
+
     @auth_routes.route('/login', methods=['POST'])
     def login():
         data = request.get_json()
@@ -16,9 +164,19 @@ def init_auth_routes(get_db):
         try:
             user = db.query(User).filter(User.username == data.get('username')).first()
 
-            if not user or not check_password_hash(user.password, data.get('password')):
+            if not user or not verify_password(user.password, data.get('password')):
+                record_login(success=False)
                 return jsonify({'message': 'Invalid credentials'}), 401
 
+            # Upgrade hashes made with older cost parameters while we have the password
+            rehashed = needs_rehash(user.password)
+            if rehashed:
+                user.password = hash_password(data.get('password'))
+                db.commit()
+            record_login(success=True, rehashed=rehashed)
+
+            import jwt
+
             token = jwt.encode({
                 'username': user.username,
                 'role': user.role,
@@ -29,16 +187,23 @@ def init_auth_routes(get_db):
                 'token': token,
                 'role': user.role
             })
+        except HashingBusy:
+            db.rollback()
+            return jsonify({'message': 'Server busy, please try again'}), 503
         finally:
             db.close()
 
     @auth_routes.route('/users', methods=['POST'])
+    @token_required(role='admin')
     def create_user():
         data = request.get_json()
         if data['role'] not in ['employee', 'admin']:
             return jsonify({'message': 'Invalid role'}), 400
 
-        hashed_password = generate_password_hash(data['password'])
+        try:
+            hashed_password = hash_password(data['password'])
+        except HashingBusy:
+            return jsonify({'message': 'Server busy, please try again'}), 503
 
         db = next(get_db())
         try:
@@ -49,6 +214,7 @@ def init_auth_routes(get_db):
             )
             db.add(new_user)
             db.commit()
+            role_map.invalidate()
             return jsonify({'message': 'User created successfully'}), 201
         except Exception as e:
             db.rollback()
@@ -56,7 +222,13 @@ def init_auth_routes(get_db):
         finally:
             db.close()
 
+    @auth_routes.route('/metrics', methods=['GET'])
+    @token_required(role='admin')
+    def get_login_metrics():
+        return jsonify(login_metrics())
+
     @auth_routes.route('/users', methods=['GET'])
+    @token_required(role='admin')
     def get_users():
         db = next(get_db())
         try:
@@ -70,6 +242,7 @@ def init_auth_routes(get_db):
             db.close()
 
     @auth_routes.route('/users/<username>', methods=['DELETE'])
+    @token_required(role='admin')
     def delete_user(username):
         db = next(get_db())
         try:
@@ -77,6 +250,7 @@ def init_auth_routes(get_db):
             if user:
                 db.delete(user)
                 db.commit()
+                role_map.invalidate()
                 return jsonify({'message': 'User deleted successfully'})
             return jsonify({'message': 'User not found'}), 404
         except Exception as e:
@@ -85,5 +259,4 @@ def init_auth_routes(get_db):
         finally:
             db.close()
 
-    # Since we're removing authorization, we'll return None for token_required
-    return auth_routes, None
\ No newline at end of file
+    return auth_routes, token_required
\ No newline at end of file
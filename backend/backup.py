@@ -0,0 +1,203 @@
+from flask import Blueprint, jsonify
+from database import engine, logging
+from datetime import datetime
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+backup_routes = Blueprint('backups', __name__)
+
+DATABASE_FILE = engine.url.database
+BACKUP_DIR = os.environ.get('BACKUP_DIR', os.path.join(os.path.dirname(DATABASE_FILE), 'backups'))
+BACKUP_RETENTION = int(os.environ.get('BACKUP_RETENTION', 7))
+BACKUP_INTERVAL_HOURS = float(os.environ.get('BACKUP_INTERVAL_HOURS', 24))
+
+BACKUP_PREFIX = 'inventory-'
+BACKUP_SUFFIX = '.db.gz'
+
+
+def list_backups():
+    """Snapshots in BACKUP_DIR, newest first"""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    backups = []
+    for name in os.listdir(BACKUP_DIR):
+        if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX):
+            path = os.path.join(BACKUP_DIR, name)
+            backups.append({
+                'name': name,
+                'size': os.path.getsize(path),
+                'created': datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+            })
+    return sorted(backups, key=lambda backup: backup['name'], reverse=True)
+
+
+def create_backup():
+    """
+    Snapshot the live database with SQLite's online backup API, then gzip it
+    and apply retention. Returns the snapshot's path.
+    The copy is one step, i.e. one read transaction: in WAL mode that doesn't
+    block the tills' writes, whereas a stepped backup starts over whenever
+    another connection writes and may never finish during business hours.
+    """
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    raw_path = os.path.join(BACKUP_DIR, f'.{BACKUP_PREFIX}{stamp}.db')
+    final_path = os.path.join(BACKUP_DIR, f'{BACKUP_PREFIX}{stamp}{BACKUP_SUFFIX}')
+    started = time.perf_counter()
+
+    source = sqlite3.connect(DATABASE_FILE, timeout=30)
+    target = sqlite3.connect(raw_path)
+    try:
+        source.backup(target, pages=-1)
+    finally:
+        target.close()
+        source.close()
+
+    try:
+        with open(raw_path, 'rb') as raw, gzip.open(final_path + '.part', 'wb', compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed, length=1024 * 1024)
+        os.replace(final_path + '.part', final_path)
+    finally:
+        os.remove(raw_path)
+
+    logger.info(f"Backup written to {final_path} in {time.perf_counter() - started:.1f}s")
+    prune_backups()
+    return final_path
+
+
+def prune_backups():
+    for backup in list_backups()[BACKUP_RETENTION:]:
+        os.remove(os.path.join(BACKUP_DIR, backup['name']))
+        logger.info(f"Removed old backup {backup['name']}")
+
+
+def restore_backup(name):
+    """
+    Replace the database with a snapshot. Run with the server stopped.
+    The snapshot is checked with PRAGMA integrity_check before anything is touched.
+    """
+    path = name if os.path.isabs(name) else os.path.join(BACKUP_DIR, name)
+    raw_path = DATABASE_FILE + '.restore'
+    with gzip.open(path, 'rb') as packed, open(raw_path, 'wb') as raw:
+        shutil.copyfileobj(packed, raw, length=1024 * 1024)
+
+    source = sqlite3.connect(raw_path)
+    try:
+        result = source.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != 'ok':
+            raise ValueError(f"Backup {name} failed integrity check: {result}")
+        target = sqlite3.connect(DATABASE_FILE, timeout=30)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+        os.remove(raw_path)
+    logger.info(f"Database restored from {path}")
+
+
+class BackupService:
+    """Takes backups on a background thread, on a schedule or on demand"""
+
+    def __init__(self, interval_hours=BACKUP_INTERVAL_HOURS):
+        self.interval = interval_hours * 3600
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.running = False
+        self.last_backup = None
+        self.last_error = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='backup-service', daemon=True)
+            self._thread.start()
+
+    def request_backup(self):
+        """Ask for a backup now; returns False if one is already running"""
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+        self.start()
+        self._wake.set()
+        return True
+
+    def _due(self):
+        if self.interval <= 0:
+            return False
+        latest = list_backups()
+        if not latest:
+            return True
+        return time.time() - os.path.getmtime(os.path.join(BACKUP_DIR, latest[0]['name'])) >= self.interval
+
+    def _loop(self):
+        while True:
+            if self._wake.is_set() or self._due():
+                self._wake.clear()
+                with self._lock:
+                    self.running = True
+                self._run()
+            self._wake.wait(timeout=min(self.interval, 3600) if self.interval > 0 else None)
+
+    def _run(self):
+        try:
+            self.last_backup = os.path.basename(create_backup())
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Backup failed: {e}")
+        finally:
+            self.running = False
+
+
+def init_backup_routes(service):
+    @backup_routes.route('', methods=['GET'])
+    def get_backups():
+        return jsonify({
+            'backups': list_backups(),
+            'running': service.running,
+            'last_backup': service.last_backup,
+            'last_error': service.last_error,
+            'retention': BACKUP_RETENTION
+        })
+
+    @backup_routes.route('', methods=['POST'])
+    def start_backup():
+        if not service.request_backup():
+            return jsonify({'success': False, 'message': 'A backup is already running'}), 409
+        return jsonify({'success': True, 'message': 'Backup started'}), 202
+
+    return backup_routes
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    try:
+        if command == 'create':
+            print(f"Backup written to {create_backup()}")
+        elif command == 'list':
+            for backup in list_backups():
+                print(f"{backup['name']}  {backup['size']} bytes  {backup['created']}")
+        elif command == 'restore' and len(sys.argv) > 2:
+            response = input(f"Restore {sys.argv[2]} over {DATABASE_FILE}? Stop the server first. (yes/no): ")
+            if response.lower() == 'yes':
+                restore_backup(sys.argv[2])
+                print("Database restored")
+            else:
+                print("Operation cancelled")
+        else:
+            print("Usage: python backup.py [create|list|restore <backup name>]")
+            sys.exit(2)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,681 @@
+"""
+Benchmarks for the backend, each run against a scratch database.
+
+    python backend/bench/bench.py <scenario> [--quick]
+    python backend/bench/bench.py list
+
+A scenario compares variants (e.g. two engine profiles). Each variant runs in
+its own child process with its own environment, since most settings are read
+at import time. Results are printed as one table per scenario. --quick shrinks
+the data sets for a smoke run; numbers quoted in commits use the defaults.
+"""
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {}
+
+
+def scenario(name, variants):
+    """Register fn(quick) as scenario `name`, run once per {label: environment} in variants"""
+    def register(fn):
+        SCENARIOS[name] = (fn, variants)
+        return fn
+    return register
+
+
+def percentiles(samples):
+    """p50/p99/max in milliseconds for a list of durations in seconds"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    pick = lambda share: ordered[min(len(ordered) - 1, int(share * len(ordered)))] * 1000
+    return {
+        'count': len(ordered),
+        'p50_ms': round(pick(0.50), 2),
+        'p99_ms': round(pick(0.99), 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def run_for(seconds, workers, until=None):
+    """
+    Run each (name, fn) worker on its own thread, calling fn() until time is up
+    or until() returns True; returns {name: [durations]}
+    """
+    deadline = time.monotonic() + seconds
+    samples = {name: [] for name, _ in workers}
+    lock = threading.Lock()
+
+    def loop(name, fn):
+        mine = []
+        while time.monotonic() < deadline and not (until and until()):
+            _, elapsed = timed(fn)
+            mine.append(elapsed)
+        with lock:
+            samples[name].extend(mine)
+
+    threads = [threading.Thread(target=loop, args=worker) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def poll_health(port, started, timeout=120):
+    """Poll /health until it answers 200; returns (seconds to any response, seconds to the 200, its body)"""
+    from urllib.error import HTTPError, URLError
+    from urllib.request import urlopen
+
+    first_response = None
+    while time.perf_counter() - started < timeout:
+        try:
+            with urlopen(f'http://127.0.0.1:{port}/health', timeout=1) as response:
+                body = json.loads(response.read())
+            now = time.perf_counter() - started
+            return first_response or now, now, body
+        except HTTPError:
+            first_response = first_response or time.perf_counter() - started
+        except (URLError, ConnectionError):
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"No healthy response on port {port} within {timeout}s")
+
+
+def cpu_seconds(pid):
+    """User + system CPU time of a process so far, where /proc has it (Linux); else None"""
+    try:
+        with open(f'/proc/{pid}/stat') as stat:
+            fields = stat.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+# Helpers below import backend modules, so they are only called in a child process,
+# and the seeders only after create_app() has created the schema
+
+def create_app():
+    import server
+    return server.create_app(background_init=False)
+
+
+def admin_headers(client):
+    token = client.post('/api/auth/login', json={'username': 'Geets', 'password': 'geets123'}).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+BRANDS = ['Crown', 'Duracoat', 'Plascon', 'Sadolin', 'Basco', 'Galaxy', 'Kenbro', 'Coral']
+COLOURS = ['White', 'Magnolia', 'Sky Blue', 'Forest Green', 'Burgundy', 'Sunflower', 'Charcoal', 'Ivory',
+           'Terracotta', 'Ocean Teal', 'Silver Grey', 'Royal Purple']
+FINISHES = ['Gloss', 'Silk Vinyl', 'Matt Emulsion', 'Undercoat', 'Primer', 'Eggshell']
+SIZES = ['1L', '4L', '5L', '20L']
+
+
+def catalog_name(i):
+    """A plausible, unique product name, e.g. 'Crown Sky Blue Matt Emulsion 4L #0042'"""
+    rng = random.Random(i)
+    return f"{rng.choice(BRANDS)} {rng.choice(COLOURS)} {rng.choice(FINISHES)} {rng.choice(SIZES)} #{i:05d}"
+
+
+def seed_products(count, stock=1_000_000, naming=lambda i: f'Paint {i:06d}'):
+    from sqlalchemy import insert
+    from database import SessionLocal, PaintClass, Product
+
+    db = SessionLocal()
+    classes = []
+    for name in ('Gloss', 'Matt', 'Primer', 'Enamel'):
+        paint_class = PaintClass(name=name)
+        db.add(paint_class)
+        classes.append(paint_class)
+    db.flush()
+    if count:
+        db.execute(insert(Product), [
+            {'name': naming(i), 'stock': stock, 'paint_class_id': classes[i % len(classes)].id}
+            for i in range(count)
+        ])
+    db.commit()
+    db.close()
+
+
+def seed_sales(count, products, days=365, batch_size=100_000):
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert
+    from database import SessionLocal, Sale
+
+    rng = random.Random(1)
+    start = datetime.now() - timedelta(days=days)
+    db = SessionLocal()
+    for offset in range(0, count, batch_size):
+        db.execute(insert(Sale), [{
+            'item_name': f'Paint {rng.randrange(products):06d}',
+            'quantity': rng.randint(1, 9),
+            'buyer_name': f'Buyer {rng.randrange(300)}',
+            'timestamp': start + timedelta(seconds=rng.randrange(days * 86400)),
+            'previous_stock': 50,
+            'new_stock': 45,
+        } for _ in range(offset, min(count, offset + batch_size))])
+        db.commit()
+    db.close()
+
+
+@scenario('profiles', {'default': {'DB_PROFILE': 'default'}, 'tuned': {'DB_PROFILE': 'tuned'}})
+def profiles(quick):
+    """Reader latency on /items?since= and /sales-history while tills keep selling (user-003)"""
+    app = create_app()
+    products = 500 if quick else 2000
+    seed_products(products)
+    seed_sales(10_000 if quick else 100_000, products)
+    errors = []
+
+    def client_call(method, path, **kwargs):
+        client = threading.local()
+
+        def call():
+            if not hasattr(client, 'value'):
+                client.value = app.test_client()
+            response = getattr(client.value, method)(path, **kwargs)
+            if response.status_code != 200 or (method == 'post' and not response.get_json()['success']):
+                errors.append(response.status_code)
+        return call
+
+    sell = client_call('post', '/api/sell', json={'name': 'Paint 000001', 'quantity': 1, 'buyerName': 'bench'})
+    items = client_call('get', '/api/items?since=1')
+    history = client_call('get', '/api/sales-history?limit=100')
+    samples = run_for(2 if quick else 5, [('sell', sell)] * 2 + [('items', items)] * 3 + [('history', history)] * 3)
+    result = {name: percentiles(durations) for name, durations in samples.items()}
+    result['errors'] = len(errors)
+    return result
+
+
+SEARCH_QUERIES = ['sky blue', 'crown magnolia silk', 'emulsoin', 'duracote', '#04217', 'teal 20l']
+
+
+@scenario('search', {'trigram': {}})
+def search(quick):
+    """/search on a 100k-product catalog, warm and right after a sale, vs the old substring scan (user-010)"""
+    from catalog import catalog_cache
+    from database import SessionLocal
+    from search import search_index
+
+    app = create_app()
+    products = 10_000 if quick else 100_000
+    seed_products(products, naming=catalog_name)
+    client = app.test_client()
+    sell = lambda: client.post('/api/sell', json={'name': catalog_name(products // 2), 'quantity': 1, 'buyerName': 'bench'})
+    get = lambda query: client.get('/api/search', query_string={'q': query})
+
+    # The first request loads the catalog and builds the index; the seeded catalog
+    # is at version 0, so the first sale after it costs a full load as well
+    _, cold_seconds = timed(get, SEARCH_QUERIES[0])
+    sell()
+    get(SEARCH_QUERIES[0])
+
+    after_sale, warm = [], []
+    for _ in range(5):
+        for query in SEARCH_QUERIES:
+            sell()
+            after_sale.append(timed(get, query)[1])
+            warm.append(timed(get, query)[1])
+
+    db = SessionLocal()
+    snapshot = catalog_cache.snapshot(db)
+    db.close()
+    index = search_index(snapshot)
+    _, build_seconds = timed(type(index), snapshot.entries)
+    # What /search did before: every name containing the query, unranked
+    folded = [(name, name.lower()) for _, name, _ in snapshot.entries]
+    substring_scan = lambda query: [name for name, lower in folded if query in lower]
+
+    indexed, scanned = [], []
+    per_query = {}
+    for _ in range(5):
+        for query in SEARCH_QUERIES:
+            hits, elapsed = timed(index.search, query, limit=20)
+            indexed.append(elapsed)
+            per_query[query] = {'top_hit': hits[0] if hits else None,
+                                'substring_hits': len(substring_scan(query.lower()))}
+            scanned.append(timed(substring_scan, query.lower())[1])
+    return {
+        'first_request_ms': round(cold_seconds * 1000, 1),
+        'endpoint_after_sale': percentiles(after_sale),
+        'endpoint_warm': percentiles(warm),
+        'index_build_ms': round(build_seconds * 1000, 1),
+        'index_search': percentiles(indexed),
+        'substring_scan': percentiles(scanned),
+        'catalog_full_loads': catalog_cache.full_loads,
+        'per_query': per_query,
+    }
+
+
+@scenario('logins', {'inline': {'PASSWORD_HASH_WORKERS': '0'}, 'pool': {'PASSWORD_HASH_WORKERS': '2'}})
+def logins(quick):
+    """/items?since= latency during a burst of logins, hashing inline vs in the process pool (user-012)"""
+    from hashing import login_metrics
+    app = create_app()
+    seed_products(500 if quick else 2000)
+    statuses = []
+
+    def login():
+        response = app.test_client().post('/api/auth/login', json={'username': 'Geets', 'password': 'geets123'})
+        statuses.append(response.status_code)
+
+    def items():
+        app.test_client().get('/api/items?since=1')
+
+    samples = run_for(3 if quick else 10, [('login', login)] * 4 + [('items', items)] * 3)
+    result = {name: percentiles(durations) for name, durations in samples.items()}
+    result['login_503s'] = statuses.count(503)
+    result['avg_hash_ms'] = login_metrics()['avg_hash_ms']
+    return result
+
+
+@scenario('backup', {'default': {'DB_PROFILE': 'default'}, 'tuned': {'DB_PROFILE': 'tuned'}})
+def backup(quick):
+    """/sell latency while a backup of a database with 1M sales runs (user-015)"""
+    import backup as backups
+    app = create_app()
+    seed_products(2000)
+    seed_sales(50_000 if quick else 1_000_000, 2000)
+    backups.BACKUP_DIR = tempfile.mkdtemp(prefix='bench-backups-')
+    failures = []
+
+    def sell():
+        response = app.test_client().post('/api/sell', json={'name': 'Paint 000001', 'quantity': 1, 'buyerName': 'bench'})
+        if response.status_code != 200 or not response.get_json()['success']:
+            failures.append(response.status_code)
+
+    idle = run_for(3, [('sell', sell)] * 2)['sell']
+    worker = threading.Thread(target=backups.create_backup)
+    worker.start()
+    busy, backup_seconds = timed(run_for, 600, [('sell', sell)] * 2, until=lambda: not worker.is_alive())
+    worker.join()
+    return {
+        'db_mb': round(os.path.getsize(backups.DATABASE_FILE) / 2**20, 1),
+        'backup_s': round(backup_seconds, 1),
+        'sell_idle': percentiles(idle),
+        'sell_during_backup': percentiles(busy['sell']),
+        'failed_sells': len(failures),
+    }
+
+
+@scenario('import', {'import': {}})
+def product_import(quick):
+    """A 50k-row CSV through /admin/products/import vs one POST /admin/products per row (user-017)"""
+    import csv
+    import io
+    app = create_app()
+    seed_products(0)
+    client = app.test_client()
+    headers = admin_headers(client)
+    rows = 5_000 if quick else 50_000
+    classes = ('Gloss', 'Matt', 'Primer', 'Enamel')
+
+    upload = io.StringIO()
+    writer = csv.writer(upload)
+    writer.writerow(['name', 'stock', 'class'])
+    for i in range(rows):
+        writer.writerow([f'Imported {i:06d}', i % 200, classes[i % 4]])
+    body = upload.getvalue().encode()
+
+    def import_csv():
+        response = client.post('/api/admin/products/import?format=csv', data=body, headers=headers)
+        return response.get_json()
+
+    created, create_seconds = timed(import_csv)
+    updated, update_seconds = timed(import_csv)
+
+    # Per-row POSTs take long enough that a sample gives the rate
+    sample = 500 if quick else 2_000
+    started = time.perf_counter()
+    for i in range(sample):
+        client.post('/api/admin/products', headers=headers,
+                    json={'name': f'Posted {i:06d}', 'stock': i % 200, 'class': classes[i % 4]})
+    post_seconds = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'import_create_s': round(create_seconds, 2),
+        'import_update_s': round(update_seconds, 2),
+        'import_rows_per_s': round(rows / create_seconds),
+        'created_updated_rejected': [created['created'], updated['updated'], len(created['errors'])],
+        'post_rows_per_s': round(sample / post_seconds),
+        'post_projected_s': round(rows * post_seconds / sample, 1),
+    }
+
+
+@scenario('logging', {
+    'off': {'BENCH_LOGGING': 'off', 'LOG_LEVEL': 'WARNING'},
+    'direct': {'BENCH_LOGGING': 'direct', 'LOG_LEVEL': 'INFO'},
+    'queued': {'BENCH_LOGGING': 'queued', 'LOG_LEVEL': 'INFO'},
+})
+def logging_overhead(quick):
+    """Latency of cheap requests with access logging off, written inline, or queued (user-019)"""
+    import logging
+    from logging.handlers import RotatingFileHandler
+    from log_config import JsonFormatter, setup_logging
+    log_file = os.path.join(os.getcwd(), 'server.log')
+    mode = os.environ['BENCH_LOGGING']
+    if mode == 'queued':
+        setup_logging(log_file=log_file)
+    elif mode == 'direct':
+        # What server.py did before: handlers on the root logger, formatting and I/O on the request thread
+        for handler in (RotatingFileHandler(log_file, maxBytes=1024 * 1024, backupCount=5), logging.StreamHandler()):
+            handler.setFormatter(JsonFormatter())
+            logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.INFO)
+
+    app = create_app()
+    seed_products(500)
+
+    def client_call(method, path, **kwargs):
+        return lambda: getattr(app.test_client(), method)(path, **kwargs)
+
+    samples = run_for(3 if quick else 10, [
+        ('classes', client_call('get', '/api/paint-classes')),
+        ('classes', client_call('get', '/api/paint-classes')),
+        ('sell', client_call('post', '/api/sell', json={'name': 'Paint 000001', 'quantity': 1, 'buyerName': 'bench'})),
+        ('sell', client_call('post', '/api/sell', json={'name': 'Paint 000002', 'quantity': 1, 'buyerName': 'bench'})),
+    ])
+    result = {name: percentiles(durations) for name, durations in samples.items()}
+    logging.shutdown()
+    result['log_kb'] = round(os.path.getsize(log_file) / 1024) if os.path.exists(log_file) else 0
+    return result
+
+
+def forecast_loop(stock, demand, params):
+    """forecast() one product at a time in plain Python, as the baseline"""
+    days = len(demand[0]) if demand else 0
+    window = min(params.average_days, days)
+    weights = [params.alpha * (1 - params.alpha) ** (days - 1 - day) for day in range(days)]
+    total_weight = sum(weights)
+    reorder = []
+    for on_hand, history in zip(stock, demand):
+        recent = history[-window:]
+        moving_average = sum(recent) / window
+        smoothed = sum(w * units for w, units in zip(weights, history)) / total_weight
+        daily = max(moving_average, smoothed)
+        deviation = (sum((units - moving_average) ** 2 for units in recent) / window) ** 0.5
+        safety_stock = params.service_z * deviation * params.lead_time_days ** 0.5
+        reorder.append(on_hand <= daily * params.lead_time_days + safety_stock and daily > 0)
+    return reorder
+
+
+@scenario('forecast', {'forecast': {}})
+def reorder_forecast(quick):
+    """Reorder forecast for 10k products x 730 days: numpy vs a Python loop, plus /reorder end to end (user-023)"""
+    from datetime import date
+    import numpy as np
+    from forecast import DEFAULT_PARAMS, ForecastParams, demand_matrix, forecast, reorder_report
+    from database import SessionLocal
+
+    products, days = (2_000, 365) if quick else (10_000, 730)
+    params = ForecastParams(today=date.today(), **dict(DEFAULT_PARAMS, history_days=days), source='raw')
+    rng = np.random.default_rng(1)
+    demand = rng.poisson(rng.uniform(0, 3, size=(products, 1)), size=(products, days)).astype(np.float64)
+    stock = rng.integers(0, 200, size=products).astype(np.float64)
+
+    # The (day, item, quantity) rows daily_demand_rows() would return for that matrix
+    index = {f'Paint {i:06d}': i for i in range(products)}
+    names = list(index)
+    nonzero = np.nonzero(demand)
+    rows = list(zip(nonzero[1].tolist(), [names[p] for p in nonzero[0]], demand[nonzero].tolist()))
+    built, build_seconds = timed(demand_matrix, rows, index, days)
+    assert np.array_equal(built, demand)
+
+    result, numpy_seconds = timed(forecast, stock, demand, params)
+    looped, loop_seconds = timed(forecast_loop, stock.tolist(), demand.tolist(), params)
+    assert looped == result['reorder'].tolist()
+
+    # End to end over the raw ledger, as GET /reports/reorder?source=raw does on a cache miss
+    create_app()
+    seed_products(2000)
+    seed_sales(50_000 if quick else 500_000, 2000, days=90)
+    db = SessionLocal()
+    report, report_seconds = timed(reorder_report, db, params._replace(history_days=90))
+    db.close()
+    return {
+        'matrix': f'{products} x {days}',
+        'demand_matrix_ms': round(build_seconds * 1000, 1),
+        'demand_rows': len(rows),
+        'numpy_forecast_ms': round(numpy_seconds * 1000, 1),
+        'python_loop_ms': round(loop_seconds * 1000, 1),
+        'speedup': round(loop_seconds / numpy_seconds),
+        'reorder_report_ms': round(report_seconds * 1000, 1),
+        'reorder_report_rows': len(report),
+    }
+
+
+@scenario('responses', {'stdlib': {'BENCH_NO_ORJSON': '1'}, 'orjson': {}})
+def responses(quick):
+    """A 100k-row /sales-history: identity vs gzip, stdlib json vs orjson (user-024)"""
+    if os.environ.get('BENCH_NO_ORJSON'):
+        sys.modules['orjson'] = None  # makes `import orjson` fail, as if it weren't installed
+    app = create_app()
+    seed_products(2000)
+    seed_sales(10_000 if quick else 100_000, 2000)
+    client = app.test_client()
+
+    def fetch(path, encoding):
+        response = client.get(path, headers={'Accept-Encoding': encoding})
+        assert response.status_code == 200
+        return len(response.data)
+
+    result = {}
+    for label, path in (('history', '/api/sales-history'), ('items', '/api/items')):
+        for encoding in ('identity', 'gzip'):
+            sizes, durations = [], []
+            for _ in range(5):
+                size, elapsed = timed(fetch, path, encoding)
+                sizes.append(size)
+                durations.append(elapsed)
+            result[f'{label}_{encoding}'] = dict(percentiles(durations), kb=round(sizes[-1] / 1024))
+
+    from paintstore import SALE_COLUMNS, serialize_sale
+    from database import SessionLocal
+    db = SessionLocal()
+    rows = [serialize_sale(sale) for sale in db.query(*SALE_COLUMNS).all()]
+    db.close()
+    with app.app_context():
+        encode = percentiles([timed(app.json.dumps, rows)[1] for _ in range(5)])
+    result['encode_only'] = encode
+    return result
+
+
+@scenario('startup', {'startup': {}})
+def startup(quick):
+    """Spawning `python server.py` to its first /health 200, on a new and an existing database (user-013)"""
+    from database import engine
+    create_app()
+    seed_products(2000)
+    seed_sales(20_000 if quick else 200_000, 2000)
+    # Importing server points os.environ['DB_PATH'] at backend/inventory.db, so
+    # the scratch database is the one the engine was built on
+    existing_db = engine.url.database
+    scratch = tempfile.mkdtemp(prefix='bench-startup-')
+    result = {}
+    for label in ('new_db', 'existing_db'):
+        listening, ready, reported = [], [], []
+        for run in range(3 if quick else 10):
+            db_path = os.path.join(scratch, f'new-{run}.db') if label == 'new_db' else existing_db
+            port = free_port()
+            env = dict(os.environ, DB_PATH=db_path, PORT=str(port), HOST='127.0.0.1')
+            started = time.perf_counter()
+            server = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, 'server.py')], env=env, cwd=scratch,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                first_response, first_ok, health = poll_health(port, started)
+            finally:
+                stop(server)
+            listening.append(first_response)
+            ready.append(first_ok)
+            reported.append(health['startup_seconds'])
+        result[f'{label}_first_response'] = percentiles(listening)
+        result[f'{label}_first_200'] = percentiles(ready)
+        # What /health reports counts from create_app(), after spawn and imports
+        result[f'{label}_reported'] = percentiles(reported)
+    return result
+
+
+@scenario('serve', {
+    'dev_server': {'BENCH_SERVER': 'dev'},
+    'waitress': {'BENCH_SERVER': 'waitress'},
+    'waitress_logging': {'BENCH_SERVER': 'waitress', 'BENCH_SERVER_LOGGING': '1', 'LOG_LEVEL': 'INFO'},
+})
+def serve_throughput(quick):
+    """Throughput of /items and /sell over real sockets: app.run() vs serve() on waitress (user-021)"""
+    import http.client
+    from database import engine
+    create_app()
+    seed_products(2000)
+    port = free_port()
+    # os.environ['DB_PATH'] now names backend/inventory.db; serve the scratch one
+    db_path = engine.url.database
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--server', os.environ['BENCH_SERVER'], str(port)],
+        env=dict(os.environ, DB_PATH=db_path), cwd=os.path.dirname(db_path),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        poll_health(port, time.perf_counter())
+        # BENCH_CLIENTS=1 shows the per-request cost without any write contention
+        clients = int(os.environ.get('BENCH_CLIENTS', 8))
+        sell_body = json.dumps({'name': 'Paint 000001', 'quantity': 1, 'buyerName': 'bench'})
+        requests = {
+            'items': ('GET', '/api/items', None, {}),
+            'sell': ('POST', '/api/sell', sell_body, {'Content-Type': 'application/json'}),
+        }
+        result = {}
+        for label, (method, path, body, headers) in requests.items():
+            # One keep-alive connection per client, reopened whenever the server closes it
+            connections = threading.local()
+            errors = []
+            reconnects = []
+
+            def call():
+                connection = getattr(connections, 'value', None)
+                if connection is None:
+                    connection = connections.value = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                    reconnects.append(1)
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                payload = response.read()
+                # A sale that runs out of stock still answers 200 with success false
+                if response.status != 200 or (method == 'POST' and not json.loads(payload)['success']):
+                    errors.append(response.status)
+                if response.will_close:
+                    connection.close()
+                    connections.value = None
+
+            seconds = 3 if quick else 10
+            cpu_before = cpu_seconds(server.pid)
+            samples = run_for(seconds, [(label, call)] * clients)[label]
+            cpu_after = cpu_seconds(server.pid)
+            result[label] = dict(percentiles(samples), req_per_s=round(len(samples) / seconds),
+                                 connections=len(reconnects), errors=len(errors))
+            if cpu_before is not None:
+                result[label]['server_cpu_ms_per_request'] = round((cpu_after - cpu_before) * 1000 / len(samples), 2)
+        return result
+    finally:
+        stop(server)
+
+
+def run_server(mode, port):
+    """Entry point for the serve scenario's server process"""
+    import server
+    app = server.create_app()
+    if os.environ.get('BENCH_SERVER_LOGGING'):
+        from log_config import setup_logging
+        setup_logging()
+    if mode == 'dev':
+        # What SERVER_MODE=development runs, minus the debugger and reloader
+        app.run(host='127.0.0.1', port=port, threaded=True)
+    else:
+        from serve import serve
+        serve(app, host='127.0.0.1', port=port)
+
+
+def run_child(name, env):
+    scratch = tempfile.mkdtemp(prefix=f'bench-{name}-')
+    child_env = dict(os.environ, **env)
+    child_env.update({'DB_PATH': os.path.join(scratch, 'inventory.db'), 'BACKUP_INTERVAL_HOURS': '0',
+                      'STOCK_CHECKPOINT_HOURS': '0',
+                      'LOG_LEVEL': child_env.get('LOG_LEVEL', 'WARNING')})
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', name] + sys.argv[2:],
+        env=child_env, cwd=scratch, capture_output=True, text=True
+    )
+    if output.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{output.stderr[-3000:]}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def print_table(results):
+    rows = []
+    for variant, result in results.items():
+        for metric, value in result.items():
+            rows.append((variant, metric, json.dumps(value) if isinstance(value, dict) else str(value)))
+    widths = [max(len(row[i]) for row in rows) for i in range(2)]
+    for variant, metric, value in rows:
+        print(f"{variant:<{widths[0]}}  {metric:<{widths[1]}}  {value}")
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] == 'list':
+        for name, (fn, variants) in SCENARIOS.items():
+            print(f"{name:<10} {', '.join(variants)}: {fn.__doc__}")
+        return 0
+    if argv[1] == '--server':
+        sys.path.insert(0, BACKEND_DIR)
+        run_server(argv[2], int(argv[3]))
+        return 0
+    if argv[1] == '--child':
+        sys.path.insert(0, BACKEND_DIR)
+        fn, _ = SCENARIOS[argv[2]]
+        result = fn('--quick' in argv)
+        print(json.dumps(result))
+        return 0
+
+    name = argv[1]
+    if name not in SCENARIOS:
+        print(f"Unknown scenario {name}; try: {', '.join(SCENARIOS)}")
+        return 2
+    _, variants = SCENARIOS[name]
+    results = {}
+    for variant, env in variants.items():
+        results[variant] = run_child(name, env)
+    print_table(results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
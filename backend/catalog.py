@@ -0,0 +1,198 @@
+from database import Product, PaintClass, CatalogState, ProductTombstone
+from sqlalchemy import or_, select, text
+from responses import dumps
+import functools
+import threading
+
+# Written as text: SQLAlchemy can't cache a compiled ON CONFLICT statement, and
+# every sale runs this one
+NEXT_VERSION = text(
+    "INSERT INTO catalog_state (id, version) VALUES (1, 1) "
+    "ON CONFLICT (id) DO UPDATE SET version = catalog_state.version + 1 RETURNING version"
+)
+
+
+def next_catalog_version(db_session):
+    """
+    Claim the next catalog version inside the caller's transaction.
+    Every write to products, paint classes or stock calls this before committing,
+    so the version moves exactly when what /items would return changes.
+    """
+    return db_session.execute(NEXT_VERSION).scalar_one()
+
+
+def current_catalog_version(db_session):
+    return db_session.query(CatalogState.version).filter_by(id=1).scalar() or 0
+
+
+def product_query(db_session):
+    """Products as (id, name, stock, paint_class) tuples, the class name joined in by id"""
+    return db_session.query(
+        Product.id, Product.name, Product.stock, PaintClass.name.label('paint_class')
+    ).outerjoin(PaintClass, Product.paint_class_id == PaintClass.id)
+
+
+def serialize_product(row, paint_class=None):
+    """A product_query() row, or a Product instance (which only holds the class id) and its class name"""
+    return {
+        'id': row.id,
+        'name': row.name,
+        'stock': row.stock,
+        'class': getattr(row, 'paint_class', paint_class)
+    }
+
+
+class CatalogSnapshot:
+    """
+    The catalog at one version: serialized products by id and the class names.
+    The JSON bodies are built on first use, since /search never needs them.
+    names_version is the version at which a product's name or class last
+    changed; entries, the (id, name, class) tuples search is built from, are
+    carried over unchanged until it moves.
+    """
+
+    def __init__(self, version, products, classes, previous=None):
+        self.version = version
+        self.products = products  # {id: serialize_product() dict}, in id order
+        self.classes = classes
+        if previous is not None:
+            self.names_version = previous.names_version
+            self.entries = previous.entries
+        else:
+            self.names_version = version
+            self.entries = tuple((item['id'], item['name'], item['class']) for item in products.values())
+
+    @functools.cached_property
+    def items_json(self):
+        return dumps(list(self.products.values()))
+
+    @functools.cached_property
+    def classes_json(self):
+        return dumps(self.classes)
+
+
+class CatalogCache:
+    """
+    Pre-serialized snapshot of the product catalog and paint classes.
+    The catalog is polled constantly, so reads are served from JSON bytes built
+    once per catalog version. Checking the version is a single-row read, which
+    also keeps every worker process coherent. Every sale moves the version, so
+    a new version is patched in from the same delta query /items?since= uses
+    rather than reloaded, and one request does it while the others wait.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.hits = 0
+        self.misses = 0
+        self.full_loads = 0
+
+    def snapshot(self, db_session):
+        version = current_catalog_version(db_session)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            # Whoever held the lock may have just brought the snapshot up to date
+            version = current_catalog_version(db_session)
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+            # pysqlite runs each SELECT in its own read snapshot, so a write committed
+            # after the version read can show up in the data. That skew is benign:
+            # writers claim a version before committing, so the data is only ever
+            # newer than its label, never older, and the next refresh re-applies it.
+            # Version 0 predates tombstones, so only a full load is safe from there.
+            if snapshot is None or not snapshot.version or snapshot.version > version:
+                snapshot = self._load(db_session, version)
+            else:
+                snapshot = self._patch(db_session, snapshot)
+            self._snapshot = snapshot
+            return snapshot
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version if snapshot else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'full_loads': self.full_loads,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None
+        }
+
+    @staticmethod
+    def _classes(db_session):
+        return [name for (name,) in db_session.query(PaintClass.name).order_by(PaintClass.id)]
+
+    def _load(self, db_session, version):
+        self.full_loads += 1
+        # Column tuples rather than ORM instances: nothing here needs identity tracking
+        rows = product_query(db_session).order_by(Product.id).all()
+        products = {row.id: serialize_product(row) for row in rows}
+        return CatalogSnapshot(version, products, self._classes(db_session))
+
+    def _patch(self, db_session, snapshot):
+        """The next snapshot: the old one with the products changed or deleted since applied"""
+        changes = catalog_changes(db_session, snapshot.version)
+        if changes['reset']:
+            return self._load(db_session, changes['version'])
+        products = dict(snapshot.products)
+        renamed = False
+        for item in changes['deleted']:
+            renamed |= products.pop(item['id'], None) is not None
+        last_id = next(reversed(products), 0)
+        appended_only = True
+        for item in changes['changed']:
+            previous = products.get(item['id'])
+            if previous is None:
+                renamed = True
+                appended_only &= item['id'] > last_id
+            elif previous['name'] != item['name'] or previous['class'] != item['class']:
+                renamed = True
+            products[item['id']] = item
+        if not appended_only:
+            products = dict(sorted(products.items()))
+        # A sale or stock change keeps the names, and with them the search index
+        return CatalogSnapshot(
+            changes['version'], products, self._classes(db_session), previous=None if renamed else snapshot
+        )
+
+
+def catalog_changes(db_session, since):
+    """
+    Products added, changed or deleted after catalog version `since`; renaming
+    a class counts as a change to every product in it.
+    A client ahead of the server (e.g. after a database restore) gets the full
+    catalog with reset=True and should replace what it holds.
+    """
+    version = current_catalog_version(db_session)
+    reset = since > version
+    incremental = since > 0 and not reset
+
+    query = product_query(db_session)
+    if incremental:
+        # Two indexed lookups, which SQLite can OR together without a table scan
+        renamed = select(PaintClass.id).where(PaintClass.version > since)
+        query = query.filter(or_(Product.version > since, Product.paint_class_id.in_(renamed)))
+    rows = query.order_by(Product.id).all()
+
+    deleted = [
+        {'id': row.id, 'name': row.name}
+        for row in db_session.query(ProductTombstone.id, ProductTombstone.name)
+        .filter(ProductTombstone.version > since).order_by(ProductTombstone.id)
+    ] if incremental else []
+    return {
+        'version': version,
+        'reset': reset,
+        'changed': [serialize_product(row) for row in rows],
+        'deleted': deleted
+    }
+
+
+catalog_cache = CatalogCache()
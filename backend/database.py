@@ -1,12 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import create_engine, event, Column, Index, Integer, String, Float, DateTime, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
 import os
 import sys
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def get_application_path():
@@ -42,22 +40,84 @@ except Exception as e:
     logger.error(f"Failed to configure database URL: {str(e)}")
     raise
 
-# Create engine with proper error handling
-try:
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
+# SQLite engine profiles, selected with the DB_PROFILE environment variable.
+# "default" is the plain engine the app always used; "tuned" puts the database
+# in WAL mode so readers no longer block behind a writer, and trades a little
+# durability on power loss (synchronous=NORMAL) for far fewer fsyncs.
+ENGINE_PROFILES = {
+    'default': {
+        'pragmas': {},
+        'pool_size': 5,
+        'max_overflow': 10,
+    },
+    'tuned': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,  # negative means KiB, i.e. 64 MiB
+            'busy_timeout': 30000,
+            'temp_store': 'MEMORY',
+        },
+        'pool_size': 10,
+        'max_overflow': 20,
+    },
+}
+
+
+def get_engine_profile():
+    """Get the engine profile named by DB_PROFILE, falling back to the tuned one"""
+    name = os.environ.get('DB_PROFILE', 'tuned')
+    if name not in ENGINE_PROFILES:
+        logger.warning(f"Unknown DB_PROFILE '{name}', using 'tuned'")
+        name = 'tuned'
+    profile = dict(ENGINE_PROFILES[name])
+    profile['pool_size'] = int(os.environ.get('DB_POOL_SIZE', profile['pool_size']))
+    profile['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', profile['max_overflow']))
+    return name, profile
+
+
+def create_db_engine(url, profile):
+    """Create an engine and apply the profile's pragmas to every new connection"""
+    db_engine = create_engine(
+        url,
         connect_args={
             "check_same_thread": False,
             "timeout": 30  # Add timeout for better error handling
-        }
+        },
+        pool_size=profile['pool_size'],
+        max_overflow=profile['max_overflow']
     )
-    logger.info("Database engine created successfully")
+
+    pragmas = profile['pragmas']
+    if pragmas:
+        @event.listens_for(db_engine, "connect")
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {pragma}={value}")
+            finally:
+                cursor.close()
+
+    return db_engine
+
+
+# Create engine with proper error handling
+try:
+    ENGINE_PROFILE_NAME, ENGINE_PROFILE = get_engine_profile()
+    engine = create_db_engine(SQLALCHEMY_DATABASE_URL, ENGINE_PROFILE)
+    logger.info(f"Database engine created successfully with '{ENGINE_PROFILE_NAME}' profile")
 except Exception as e:
     logger.error(f"Failed to create database engine: {str(e)}")
     raise
 
 # Session configuration
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# One session per request thread; server.py removes it in teardown_appcontext
+# so no identity map outlives the request that filled it.
+db_session = scoped_session(SessionLocal)
 Base = declarative_base()
 
 # Models
@@ -75,7 +135,9 @@ class Product(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     stock = Column(Integer)
-    paint_class = Column(String)
+    # The class is referenced by id, so renaming it rewrites one paint_classes row
+    paint_class_id = Column(Integer, ForeignKey('paint_classes.id'), index=True)
+    version = Column(Integer, default=0, index=True)  # catalog version of the last change
 
 class Sale(Base):
     __tablename__ = "sales"
@@ -87,10 +149,78 @@ class Sale(Base):
     previous_stock = Column(Integer)
     new_stock = Column(Integer)
 
+    __table_args__ = (
+        Index('ix_sales_timestamp', 'timestamp'),
+        # NOCASE lets case-insensitive prefix (LIKE 'x%') and equality lookups use the index
+        Index('ix_sales_buyer_name_timestamp', buyer_name.collate('NOCASE'), timestamp),
+        # Ids are never reused, so rows moved to the archive database keep unique ids
+        {'sqlite_autoincrement': True},
+    )
+
+class DailySalesRollup(Base):
+    """Per-day sales totals (Africa/Nairobi dates), maintained alongside every sale"""
+    __tablename__ = "daily_sales_rollup"
+    date = Column(String, primary_key=True)  # YYYY-MM-DD
+    item_name = Column(String, primary_key=True)
+    buyer_name = Column(String, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    transactions = Column(Integer, nullable=False, default=0)
+
+class CatalogState(Base):
+    """Single-row counter bumped by every catalog or stock change"""
+    __tablename__ = "catalog_state"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class ProductTombstone(Base):
+    """Deleted products, so delta syncs can tell clients what to drop"""
+    __tablename__ = "product_tombstones"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    version = Column(Integer, index=True)
+
+class SalesArchiveState(Base):
+    """How far back sales have been moved out of the live table into the archive database"""
+    __tablename__ = "sales_archive_state"
+    id = Column(Integer, primary_key=True)
+    archived_before = Column(String)  # YYYY-MM-DD; earlier sales live in the archive
+    archived_rows = Column(Integer, default=0)
+
+class StockMovement(Base):
+    """Every change to a product's stock: sale, restock, adjustment or return"""
+    __tablename__ = "stock_movements"
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer)
+    item_name = Column(String)
+    kind = Column(String)
+    quantity = Column(Integer)  # signed change, negative for sales
+    previous_stock = Column(Integer)
+    new_stock = Column(Integer)
+    timestamp = Column(DateTime)
+    note = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index('ix_stock_movements_product_id_timestamp', 'product_id', 'timestamp'),
+    )
+
+class StockCheckpoint(Base):
+    """Stock of every product at a point in time, so as-of queries only replay recent movements"""
+    __tablename__ = "stock_checkpoints"
+    id = Column(Integer, primary_key=True)
+    taken_at = Column(DateTime, index=True)
+    last_movement_id = Column(Integer)  # movements up to this id are included
+
+class StockCheckpointItem(Base):
+    __tablename__ = "stock_checkpoint_items"
+    checkpoint_id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    stock = Column(Integer)
+
 class PaintClass(Base):
     __tablename__ = "paint_classes"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
+    version = Column(Integer, default=0)  # catalog version of the last rename
 
 def get_db():
     """Database session generator with proper error handling"""
@@ -103,4 +233,9 @@ def get_db():
         raise
     finally:
         logger.debug("Closing database session")
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def remove_session(exception=None):
+    """Close the current thread's scoped session and return its connection to the pool"""
+    db_session.remove()
@@ -1,4 +1,4 @@
-from database import SessionLocal, Sale, logging
+from database import SessionLocal, Sale, DailySalesRollup, logging
 import sys
 
 # Set up logging
@@ -19,6 +19,7 @@ def clear_sales_history():
 
         # Delete all records from the sales table
         db.query(Sale).delete()
+        db.query(DailySalesRollup).delete()
 
         # Commit the transaction
         db.commit()
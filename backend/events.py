@@ -0,0 +1,157 @@
+from flask import Blueprint, Response, request
+from catalog import catalog_changes, current_catalog_version
+from collections import deque
+import json
+import os
+import threading
+
+event_routes = Blueprint('events', __name__)
+
+# Recent events kept for clients resuming with Last-Event-ID; older gaps are
+# filled from the catalog's delta sync instead.
+EVENT_BUFFER_SIZE = int(os.environ.get('EVENT_BUFFER_SIZE', 1000))
+EVENT_KEEPALIVE_SECONDS = float(os.environ.get('EVENT_KEEPALIVE_SECONDS', 15))
+# Each stream holds a server thread while open, so leave some for ordinary requests
+EVENTS_MAX_CLIENTS = int(os.environ.get('EVENTS_MAX_CLIENTS', 24))
+
+
+def format_event(event_id, kind, data):
+    return f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+
+
+class EventBroadcaster:
+    """
+    In-process fan-out of catalog and stock changes. Event ids are catalog
+    versions, so they increase with every write and a client that saw id N can
+    ask the catalog for whatever changed after N. Subscribers wait on a shared
+    condition, never on the database.
+    """
+
+    def __init__(self, buffer_size=EVENT_BUFFER_SIZE):
+        self._condition = threading.Condition()
+        self._publish_lock = threading.Lock()
+        self._events = deque(maxlen=buffer_size)
+        self.latest_id = None
+        self.clients = 0
+        self.closed = False
+
+    def commit(self, db_session, event_id, kind, data):
+        """
+        Commit the session, then publish. Writers are already serialized by the
+        SQLite write lock, so holding this lock across both keeps events in
+        commit (and version) order.
+        """
+        with self._publish_lock:
+            db_session.commit()
+            self.publish(event_id, kind, data)
+
+    def publish(self, event_id, kind, data):
+        with self._condition:
+            self._events.append((event_id, format_event(event_id, kind, json.dumps(data))))
+            self.latest_id = event_id
+            self._condition.notify_all()
+
+    def since(self, last_id):
+        """Buffered (id, event) pairs after last_id, or None if the buffer no longer reaches back that far"""
+        with self._condition:
+            if not self._events or self._events[0][0] > last_id + 1:
+                return None
+            return [(event_id, event) for event_id, event in self._events if event_id > last_id]
+
+    def wait(self, last_id, timeout):
+        """Block until there are events after last_id, the timeout passes, or the broadcaster closes"""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.closed or (self.latest_id is not None and self.latest_id > last_id),
+                timeout=timeout
+            )
+            return [(event_id, event) for event_id, event in self._events if event_id > last_id]
+
+    def close(self):
+        """End every open stream, e.g. so a graceful shutdown is not held up by them"""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def subscribe(self):
+        with self._condition:
+            if self.closed or self.clients >= EVENTS_MAX_CLIENTS:
+                return False
+            self.clients += 1
+            return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self.clients -= 1
+
+    def stats(self):
+        with self._condition:
+            return {
+                'clients': self.clients,
+                'max_clients': EVENTS_MAX_CLIENTS,
+                'latest_id': self.latest_id,
+                'buffered': len(self._events)
+            }
+
+
+broadcaster = EventBroadcaster()
+
+
+def init_event_routes(db_session):
+    @event_routes.route('/events', methods=['GET'])
+    def stream_events():
+        last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        try:
+            last_id = int(last_id) if last_id else None
+        except ValueError:
+            last_id = None
+
+        # All database work happens here, before streaming starts, so an open
+        # stream holds no session or connection.
+        current = current_catalog_version(db_session)
+        if broadcaster.latest_id is None:
+            broadcaster.latest_id = current
+        backlog = []
+        if last_id is None or last_id > current:
+            backlog.append(format_event(current, 'ready', json.dumps({'version': current})))
+            last_id = current
+        elif last_id < current:
+            buffered = broadcaster.since(last_id)
+            if not buffered:
+                # Too far behind for the buffer: one delta sync catches the client up
+                changes = catalog_changes(db_session, last_id)
+                backlog.append(format_event(changes['version'], 'changes', json.dumps(changes)))
+                last_id = changes['version']
+            else:
+                backlog.extend(event for _, event in buffered)
+                last_id = buffered[-1][0]
+
+        if not broadcaster.subscribe():
+            return Response('Too many event streams', status=503, headers={'Retry-After': '5'})
+
+        def generate(last_id):
+            yield "retry: 3000\n\n"
+            for event in backlog:
+                yield event
+            while not broadcaster.closed:
+                events = broadcaster.wait(last_id, EVENT_KEEPALIVE_SECONDS)
+                if not events:
+                    # Comment line: keeps proxies from timing out and finds dead clients
+                    yield ": keepalive\n\n"
+                    continue
+                for event_id, event in events:
+                    yield event
+                last_id = events[-1][0]
+
+        response = Response(generate(last_id), mimetype='text/event-stream')
+        # Runs however the stream ends, even if the client left before the first event
+        response.call_on_close(broadcaster.unsubscribe)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    @event_routes.route('/admin/events', methods=['GET'])
+    def event_stats():
+        return broadcaster.stats()
+
+    return event_routes
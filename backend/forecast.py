@@ -0,0 +1,148 @@
+from database import Product, Sale, DailySalesRollup
+from catalog import current_catalog_version, product_query
+from sqlalchemy import Integer, func, select
+from collections import OrderedDict, namedtuple
+from datetime import datetime, time, timedelta
+import threading
+import numpy as np
+
+ForecastParams = namedtuple('ForecastParams', [
+    'today', 'history_days', 'average_days', 'alpha', 'lead_time_days', 'cover_days', 'service_z', 'source'
+])
+
+DEFAULT_PARAMS = {
+    'history_days': 90,     # days of sales loaded into the demand matrix
+    'average_days': 28,     # moving-average window
+    'alpha': 0.2,           # smoothing factor for the exponentially weighted average
+    'lead_time_days': 7,    # days between ordering and the delivery arriving
+    'cover_days': 30,       # stock an order should leave on hand beyond the lead time
+    'service_z': 1.65,      # safety stock in standard deviations (~95% service level)
+}
+
+
+def daily_demand_rows(db_session, start, end, source='rollup'):
+    """
+    (day offset from start, item_name, quantity) totals from the rollup or the
+    raw sales ledger. Runs on the Core connection: at hundreds of thousands of
+    rows the ORM's per-row overhead would cost more than the query.
+    """
+    connection = db_session.connection()
+    if source == 'raw':
+        day = func.date(Sale.timestamp)
+        offset = func.cast(func.julianday(day) - func.julianday(start.isoformat()), Integer)
+        return connection.execute(
+            select(offset, Sale.item_name, func.sum(Sale.quantity))
+            .where(Sale.timestamp >= datetime.combine(start, time.min),
+                   Sale.timestamp < datetime.combine(end + timedelta(days=1), time.min))
+            .group_by(day, Sale.item_name)
+        ).all()
+    offset = func.cast(func.julianday(DailySalesRollup.date) - func.julianday(start.isoformat()), Integer)
+    return connection.execute(
+        select(offset, DailySalesRollup.item_name, func.sum(DailySalesRollup.quantity))
+        .where(DailySalesRollup.date.between(start.isoformat(), end.isoformat()))
+        .group_by(DailySalesRollup.date, DailySalesRollup.item_name)
+    ).all()
+
+
+def demand_matrix(rows, product_index, days):
+    """Products x days array of units sold; sales of unknown items are dropped"""
+    demand = np.zeros((len(product_index), days))
+    if not rows:
+        return demand
+    offsets = np.fromiter((offset for offset, _, _ in rows), dtype=np.int64, count=len(rows))
+    products = np.fromiter((product_index.get(name, -1) for _, name, _ in rows), dtype=np.int64, count=len(rows))
+    quantities = np.fromiter((quantity or 0 for _, _, quantity in rows), dtype=np.float64, count=len(rows))
+    keep = (products >= 0) & (offsets >= 0) & (offsets < days)
+    np.add.at(demand, (products[keep], offsets[keep]), quantities[keep])
+    return demand
+
+
+def forecast(stock, demand, params):
+    """
+    Vectorized demand forecast and reorder suggestion for every product at once.
+    stock is a length-P array and demand a P x days matrix of daily units sold,
+    oldest day first. Returns a dict of length-P arrays.
+    """
+    days = demand.shape[1]
+    moving_average = demand[:, -min(params.average_days, days):].mean(axis=1)
+
+    # Exponentially weighted average as one matrix-vector product: the newest
+    # day has weight alpha, each older day (1 - alpha) times the next.
+    weights = params.alpha * (1 - params.alpha) ** np.arange(days - 1, -1, -1)
+    smoothed = demand @ (weights / weights.sum())
+
+    daily = np.maximum(moving_average, smoothed)
+    deviation = demand[:, -min(params.average_days, days):].std(axis=1)
+    safety_stock = params.service_z * deviation * np.sqrt(params.lead_time_days)
+    reorder_point = daily * params.lead_time_days + safety_stock
+    target = daily * (params.lead_time_days + params.cover_days) + safety_stock
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(daily > 0, stock / daily, np.inf)
+
+    return {
+        'moving_average': moving_average,
+        'smoothed': smoothed,
+        'daily_demand': daily,
+        'days_of_cover': days_of_cover,
+        'reorder_point': reorder_point,
+        'reorder_quantity': np.maximum(np.ceil(target - stock), 0),
+        'reorder': (stock <= reorder_point) & (daily > 0),
+    }
+
+
+def reorder_report(db_session, params):
+    """Forecast every product and list them, those running out soonest first"""
+    products = product_query(db_session).order_by(Product.id).all()
+    product_index = {product.name: index for index, product in enumerate(products)}
+    start = params.today - timedelta(days=params.history_days - 1)
+
+    rows = daily_demand_rows(db_session, start, params.today, params.source)
+    demand = demand_matrix(rows, product_index, params.history_days)
+    stock = np.fromiter((product.stock or 0 for product in products), dtype=np.float64, count=len(products))
+    result = forecast(stock, demand, params)
+
+    order = np.lexsort((-result['daily_demand'], result['days_of_cover']))
+    return [{
+        'id': products[i].id,
+        'name': products[i].name,
+        'class': products[i].paint_class,
+        'stock': products[i].stock,
+        'moving_average': round(float(result['moving_average'][i]), 3),
+        'smoothed': round(float(result['smoothed'][i]), 3),
+        'daily_demand': round(float(result['daily_demand'][i]), 3),
+        'days_of_cover': None if np.isinf(result['days_of_cover'][i]) else round(float(result['days_of_cover'][i]), 1),
+        'reorder_point': round(float(result['reorder_point'][i]), 1),
+        'reorder_quantity': int(result['reorder_quantity'][i]),
+        'reorder': bool(result['reorder'][i]),
+    } for i in order]
+
+
+class ReorderCache:
+    """
+    Reorder reports keyed by their parameters. Every sale and stock change bumps
+    the catalog version, so a report stays valid until the version moves.
+    """
+
+    def __init__(self, size=16):
+        self._lock = threading.Lock()
+        self._reports = OrderedDict()
+        self.size = size
+
+    def get(self, db_session, params):
+        version = current_catalog_version(db_session)
+        with self._lock:
+            cached = self._reports.get(params)
+            if cached and cached[0] == version:
+                self._reports.move_to_end(params)
+                return cached[1]
+        report = reorder_report(db_session, params)
+        with self._lock:
+            self._reports[params] = (version, report)
+            self._reports.move_to_end(params)
+            while len(self._reports) > self.size:
+                self._reports.popitem(last=False)
+        return report
+
+
+reorder_cache = ReorderCache()
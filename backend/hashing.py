@@ -0,0 +1,118 @@
+from werkzeug.security import generate_password_hash, check_password_hash
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+# Hashes made with any other method are rehashed on the next successful login.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+# 0 hashes on the request thread (e.g. when processes can't be spawned)
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(2, os.cpu_count() or 1)))
+HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE', HASH_WORKERS * 8))
+HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 30))
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue stays full, or a hash doesn't finish, within HASH_TIMEOUT"""
+
+
+class HashingPool:
+    """
+    Runs the deliberately slow password KDFs in a bounded process pool, so a
+    burst of logins at shift change can't starve every other request thread of
+    the GIL. The semaphore caps how many hashes may be queued at once.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max(queue_size, 1))
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'logins': 0,
+            'login_failures': 0,
+            'rehashed': 0,
+            'hashes': 0,
+            'hash_seconds': 0.0,
+            'busy_rejections': 0,
+        }
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def run(self, fn, *args):
+        start = time.perf_counter()
+        if self.workers <= 0:
+            result = fn(*args)
+        else:
+            if not self._slots.acquire(timeout=HASH_TIMEOUT):
+                self.stats['busy_rejections'] += 1
+                raise HashingBusy("Password hashing queue is full")
+            try:
+                try:
+                    future = self._get_executor().submit(fn, *args)
+                except BaseException:
+                    self._slots.release()
+                    raise
+                # The slot is held until the job leaves the pool, not until we stop
+                # waiting for it, so the queue stays bounded even after timeouts.
+                future.add_done_callback(lambda _: self._slots.release())
+                result = future.result(timeout=HASH_TIMEOUT)
+            except FutureTimeoutError:
+                self.stats['busy_rejections'] += 1
+                raise HashingBusy("Password hashing timed out")
+            except BrokenProcessPool:
+                logger.error("Password hashing pool broke, restarting it")
+                with self._lock:
+                    self._executor = None
+                result = fn(*args)
+        self.stats['hashes'] += 1
+        self.stats['hash_seconds'] += time.perf_counter() - start
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+hashing_pool = HashingPool(HASH_WORKERS, HASH_QUEUE_SIZE)
+
+
+def hash_password(password):
+    return hashing_pool.run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    return hashing_pool.run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True if the hash was made with a method other than PASSWORD_HASH_METHOD"""
+    return password_hash.split('$', 1)[0] != PASSWORD_HASH_METHOD
+
+
+def record_login(success, rehashed=False):
+    stats = hashing_pool.stats
+    stats['logins' if success else 'login_failures'] += 1
+    if rehashed:
+        stats['rehashed'] += 1
+
+
+def login_metrics():
+    stats = dict(hashing_pool.stats)
+    stats['avg_hash_ms'] = round(stats['hash_seconds'] / stats['hashes'] * 1000, 2) if stats['hashes'] else None
+    stats['workers'] = hashing_pool.workers
+    stats['method'] = PASSWORD_HASH_METHOD
+    return stats
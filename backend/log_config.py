@@ -0,0 +1,118 @@
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+# Sampled records (health checks) and DEBUG records are let through at most
+# once per LOG_SAMPLE_SECONDS for each distinct message; the rest are counted.
+LOG_SAMPLE_SECONDS = float(os.environ.get('LOG_SAMPLE_SECONDS', 60))
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+# Extra attributes copied into each JSON line when a record carries them
+CONTEXT_FIELDS = ('request_id', 'method', 'path', 'status', 'latency_ms', 'bytes', 'sql_count', 'sql_ms',
+                  'suppressed')
+
+
+def log_file_path():
+    if getattr(sys, 'frozen', False):
+        # If running as bundled exe, log to user's app data directory
+        log_dir = os.path.join(os.getenv('APPDATA'), 'PaintStore')
+        os.makedirs(log_dir, exist_ok=True)
+        return os.path.join(log_dir, 'backend.log')
+    # If running in development, log to current directory
+    return 'backend.log'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records made while handling a request with its id"""
+
+    def filter(self, record):
+        if getattr(record, 'request_id', None) is None:
+            try:
+                from flask import g, has_request_context
+                if has_request_context():
+                    record.request_id = g.get('request_id')
+            except ImportError:
+                pass
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Rate-limit noisy records: DEBUG, and anything logged with extra={'sampled': True}"""
+
+    def __init__(self, interval=LOG_SAMPLE_SECONDS):
+        super().__init__()
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._seen = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG and not getattr(record, 'sampled', False):
+            return True
+        key = (record.name, record.msg, getattr(record, 'path', None))
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._seen.get(key, (None, 0))
+            if last is not None and now - last < self.interval:
+                self._seen[key] = (last, suppressed + 1)
+                return False
+            self._seen[key] = (now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+def setup_logging(log_file=None, level=LOG_LEVEL):
+    """
+    Route all logging through a queue: request threads only enqueue records,
+    and a background listener formats them as JSON lines and does the file
+    I/O and rotation. Returns the listener, which is stopped (and flushed) at exit.
+    """
+    handlers = [RotatingFileHandler(log_file or log_file_path(), maxBytes=1024 * 1024, backupCount=5)]
+    if not getattr(sys, 'frozen', False):
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # Requests are logged by the app itself, with latency; skip werkzeug's access lines
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,137 @@
+from sqlalchemy import event
+from flask import g, has_request_context
+from bisect import bisect_left
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Statements slower than this are logged with their query plan; a negative value turns it off
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 250))
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+
+
+class RequestMetrics:
+    """Per-route request counters and latency histograms, rendered in Prometheus text format"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.latency = {}     # (method, route) -> [bucket counts..., +Inf count, sum]
+        self.statuses = {}    # (method, route, status) -> count
+        self.bytes = {}       # (method, route) -> total response bytes
+        self.sql = {}         # (method, route) -> [statements, seconds]
+
+    def observe(self, method, route, status, seconds, size, statements, sql_seconds):
+        key = (method, route)
+        with self._lock:
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[bisect_left(self.buckets, seconds)] += 1
+            histogram[-1] += seconds
+            status_key = (method, route, status)
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+            if size is not None:
+                self.bytes[key] = self.bytes.get(key, 0) + size
+            sql = self.sql.setdefault(key, [0, 0.0])
+            sql[0] += statements
+            sql[1] += sql_seconds
+
+    def render(self):
+        with self._lock:
+            latency = {key: list(value) for key, value in self.latency.items()}
+            statuses = dict(self.statuses)
+            sizes = dict(self.bytes)
+            sql = {key: list(value) for key, value in self.sql.items()}
+
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (method, route), histogram in sorted(latency.items()):
+            labels = f'method="{method}",route="{escape_label(route)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), histogram[:-1]):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {histogram[-1]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+        lines += [
+            '# HELP http_requests_total Requests by route and status code.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (method, route, status), count in sorted(statuses.items()):
+            lines.append(
+                f'http_requests_total{{method="{method}",route="{escape_label(route)}",status="{status}"}} {count}'
+            )
+
+        lines += [
+            '# HELP http_response_bytes_total Response body bytes by route (streamed bodies excluded).',
+            '# TYPE http_response_bytes_total counter',
+        ]
+        for (method, route), size in sorted(sizes.items()):
+            lines.append(f'http_response_bytes_total{{method="{method}",route="{escape_label(route)}"}} {size}')
+
+        lines += [
+            '# HELP http_sql_statements_total SQL statements executed while handling requests.',
+            '# TYPE http_sql_statements_total counter',
+        ]
+        for (method, route), (statements, _) in sorted(sql.items()):
+            lines.append(f'http_sql_statements_total{{method="{method}",route="{escape_label(route)}"}} {statements}')
+
+        lines += [
+            '# HELP http_sql_seconds_total Time spent in SQL while handling requests.',
+            '# TYPE http_sql_seconds_total counter',
+        ]
+        for (method, route), (_, seconds) in sorted(sql.items()):
+            lines.append(f'http_sql_seconds_total{{method="{method}",route="{escape_label(route)}"}} {seconds:.6f}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def explain(cursor, statement, parameters):
+    """EXPLAIN QUERY PLAN for a statement on the connection that just ran it, or None"""
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        rows = cursor.connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+        return '; '.join(row[-1] for row in rows)
+    except Exception:
+        return None
+
+
+def install_sql_instrumentation(engine, slow_query_ms=SLOW_QUERY_MS):
+    """
+    Time every statement on engine. Counts and time are added to the current
+    request (g.sql_statements, g.sql_seconds); statements slower than
+    slow_query_ms are logged with their query plan, whether or not they ran
+    inside a request.
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        if has_request_context():
+            g.sql_statements = g.get('sql_statements', 0) + 1
+            g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+        if 0 <= slow_query_ms <= elapsed * 1000:
+            plan = None if executemany else explain(cursor, statement, parameters)
+            logger.warning(
+                f"Slow query ({elapsed * 1000:.1f}ms): {' '.join(statement.split())}"
+                + (f" | plan: {plan}" if plan else '')
+            )
+
+
+request_metrics = RequestMetrics()
@@ -1,49 +1,268 @@
 # migrations.py
-from sqlalchemy import create_engine, text
-from database import SQLALCHEMY_DATABASE_URL, Base
+from sqlalchemy import MetaData, text
+from sqlalchemy.schema import CreateTable
+from database import (engine, Base, Product, Sale, SessionLocal,
+                      DailySalesRollup, CatalogState, ProductTombstone,
+                      SalesArchiveState, StockMovement, StockCheckpoint, StockCheckpointItem)
+from rollup import backfill_if_empty
+from collections import namedtuple
+from datetime import datetime
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+Migration = namedtuple('Migration', ['version', 'description', 'apply'])
 
-def run_migrations():
-    """Run database migrations to handle schema changes"""
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Ordered schema changes. Each one runs once, inside its own transaction, and is
+# recorded in schema_version; a boot with nothing pending costs two tiny queries.
+# Append new steps with the next version number and never edit applied ones.
+MIGRATIONS = []
 
+
+def migration(version, description):
+    def register(apply):
+        assert not MIGRATIONS or version > MIGRATIONS[-1].version, "Migrations must be in order"
+        MIGRATIONS.append(Migration(version, description, apply))
+        return apply
+    return register
+
+
+def column_exists(connection, table, column):
+    result = connection.execute(
+        text("SELECT 1 FROM pragma_table_info(:table) WHERE name = :column"),
+        {'table': table, 'column': column}
+    )
+    return result.fetchone() is not None
+
+
+def add_column(connection, table, column, ddl):
+    """ALTER TABLE ADD COLUMN, skipped on databases that already have it"""
+    if not column_exists(connection, table, column):
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def rebuild_table(connection, table, select_columns, batch_size=50000):
+    """
+    SQLite's table-rebuild pattern for changes ALTER TABLE can't make (changing
+    a column's type or constraints, dropping a constrained column...): create
+    the new table under a temporary name, copy rows across in rowid batches,
+    drop the old one, rename, and recreate the model's indexes.
+    `table` is the SQLAlchemy Table with the target schema and `select_columns`
+    maps each of its columns to an SQL expression over the old table.
+    Runs inside the migration's transaction, so a failure leaves the old table.
+    """
+    name = table.name
+    temp_name = f"_{name}_rebuild"
+
+    # Same columns and constraints under the temporary name; indexes come after the rename.
+    # Referenced tables are copied too (never created) so foreign keys resolve.
+    metadata = MetaData()
+    for foreign_key in table.foreign_keys:
+        foreign_key.column.table.to_metadata(metadata)
+    temp_table = table.to_metadata(metadata, name=temp_name)
+    temp_table.indexes.clear()
+    connection.execute(CreateTable(temp_table))
+
+    columns = ', '.join(select_columns)
+    expressions = ', '.join(select_columns.values())
+    total = connection.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+    last_rowid = -1
+    copied = 0
+    while True:
+        upper = connection.execute(text(
+            f"SELECT max(rowid) FROM (SELECT rowid FROM {name} WHERE rowid > :last ORDER BY rowid LIMIT :size)"
+        ), {'last': last_rowid, 'size': batch_size}).scalar()
+        if upper is None:
+            break
+        result = connection.execute(text(
+            f"INSERT INTO {temp_name} ({columns}) SELECT {expressions} FROM {name} "
+            f"WHERE rowid > :last AND rowid <= :upper"
+        ), {'last': last_rowid, 'upper': upper})
+        copied += result.rowcount
+        last_rowid = upper
+        logger.info(f"Rebuilding {name}: copied {copied}/{total} rows")
+
+    connection.execute(text(f"DROP TABLE {name}"))
+    connection.execute(text(f"ALTER TABLE {temp_name} RENAME TO {name}"))
+    for index in table.indexes:
+        index.create(bind=connection, checkfirst=True)
+
+
+@migration(1, "Add buyer_name to sales")
+def add_sales_buyer_name(connection):
+    add_column(connection, 'sales', 'buyer_name', "VARCHAR DEFAULT 'Unknown'")
+
+
+@migration(2, "Index sales by timestamp and (buyer_name, timestamp)")
+def add_sales_indexes(connection):
+    for index in Sale.__table__.indexes:
+        index.create(bind=connection, checkfirst=True)
+
+
+@migration(3, "Create and backfill daily_sales_rollup")
+def add_daily_sales_rollup(connection):
+    DailySalesRollup.__table__.create(bind=connection, checkfirst=True)
+    db = SessionLocal(bind=connection)
     try:
-        # Check if buyer_name column exists
-        with engine.connect() as connection:
-            # Get column info from sales table
-            result = connection.execute(text("""
-                SELECT name FROM pragma_table_info('sales')
-                WHERE name='buyer_name'
-            """))
-            buyer_name_exists = result.fetchone() is not None
-
-            if not buyer_name_exists:
-                logger.info("Adding buyer_name column to sales table...")
-                # Add buyer_name column with default value
-                connection.execute(text("""
-                    ALTER TABLE sales 
-                    ADD COLUMN buyer_name VARCHAR DEFAULT 'Unknown'
-                """))
-                connection.commit()
-                logger.info("Successfully added buyer_name column")
-            else:
-                logger.info("buyer_name column already exists")
+        backfill_if_empty(db)
+    finally:
+        db.close()
 
-    except Exception as e:
-        logger.error(f"Error during migration: {str(e)}")
-        raise
+
+@migration(4, "Add catalog versioning and product tombstones")
+def add_catalog_versioning(connection):
+    add_column(connection, 'products', 'version', "INTEGER DEFAULT 0")
+    for index in Product.__table__.indexes:
+        # Skip indexes on columns that later migrations add
+        if all(column_exists(connection, 'products', column.name) for column in index.columns):
+            index.create(bind=connection, checkfirst=True)
+    CatalogState.__table__.create(bind=connection, checkfirst=True)
+    ProductTombstone.__table__.create(bind=connection, checkfirst=True)
+
+
+@migration(5, "Track sales archival")
+def add_sales_archive_state(connection):
+    SalesArchiveState.__table__.create(bind=connection, checkfirst=True)
+
+
+@migration(6, "Add the stock movement ledger with an opening checkpoint")
+def add_stock_ledger(connection):
+    from paintstore import eat_timezone
+    for model in (StockMovement, StockCheckpoint, StockCheckpointItem):
+        model.__table__.create(bind=connection, checkfirst=True)
+    # Stock on hand before the ledger existed becomes its opening balance
+    taken_at = datetime.now(eat_timezone()).replace(tzinfo=None)
+    checkpoint_id = connection.execute(
+        StockCheckpoint.__table__.insert().values(taken_at=taken_at, last_movement_id=0)
+    ).inserted_primary_key[0]
+    connection.execute(text(
+        "INSERT INTO stock_checkpoint_items (checkpoint_id, product_id, stock) "
+        "SELECT :checkpoint_id, id, coalesce(stock, 0) FROM products"
+    ), {'checkpoint_id': checkpoint_id})
+
+
+@migration(7, "Reference paint classes from products by id")
+def add_product_paint_class_id(connection):
+    add_column(connection, 'paint_classes', 'version', "INTEGER DEFAULT 0")
+    if not column_exists(connection, 'products', 'paint_class'):
+        # Created from the models (e.g. by init_db.py) and replayed: already by id
+        return
+    # Free-text classes with no paint_classes row become classes of their own
+    connection.execute(text(
+        "INSERT INTO paint_classes (name) SELECT DISTINCT paint_class FROM products "
+        "WHERE paint_class IS NOT NULL AND paint_class NOT IN (SELECT name FROM paint_classes)"
+    ))
+    # Rebuilt rather than altered: ADD COLUMN can't drop the old text column
+    rebuild_table(connection, Product.__table__, {
+        'id': 'id',
+        'name': 'name',
+        'stock': 'stock',
+        'paint_class_id': '(SELECT paint_classes.id FROM paint_classes WHERE paint_classes.name = products.paint_class)',
+        'version': 'version',
+    })
+
+
+@migration(8, "Never reuse sales ids")
+def autoincrement_sales_ids(connection):
+    from archive import archived_max_id
+    table_sql = connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'sales'"
+    )).scalar()
+    if 'AUTOINCREMENT' not in table_sql.upper():
+        rebuild_table(connection, Sale.__table__, {column.name: column.name for column in Sale.__table__.columns})
+    # New ids must also clear those of sales already moved to the archive, which
+    # an emptied live table would otherwise hand out again
+    floor = archived_max_id()
+    sequence = connection.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'sales'")).fetchone()
+    if sequence is None:
+        connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('sales', :seq)"), {'seq': floor})
+    elif sequence[0] < floor:
+        connection.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'sales'"), {'seq': floor})
+
+
+def ensure_version_table(connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR,
+            applied_at DATETIME
+        )
+    """))
+
+
+def current_version(connection):
+    """Highest applied migration, or None if the database predates schema_version"""
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    )).fetchone()
+    if not exists:
+        return None
+    return connection.execute(text("SELECT max(version) FROM schema_version")).scalar() or 0
+
+
+def record_version(connection, step):
+    connection.execute(
+        text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :at)"),
+        {'v': step.version, 'd': step.description, 'at': datetime.utcnow()}
+    )
+
+
+def run_migrations(engine=engine):
+    """Bring the database up to the latest schema version, applying only pending steps"""
+    latest = MIGRATIONS[-1].version
+    with engine.connect() as connection:
+        version = current_version(connection)
+        if version == latest:
+            logger.info(f"Database schema is at version {version}, nothing to migrate")
+            return
+
+        # pysqlite only opens transactions before DML, so take manual control
+        # to make each step's DDL and data changes commit or roll back together.
+        connection.commit()
+        dbapi_connection = connection.connection.driver_connection
+        isolation_level = dbapi_connection.isolation_level
+        dbapi_connection.isolation_level = None
+        try:
+            if version is None:
+                has_tables = connection.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+                )).fetchone()
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+                ensure_version_table(connection)
+                if not has_tables:
+                    # Fresh database: the models already describe the latest schema
+                    logger.info(f"Creating database schema at version {latest}")
+                    Base.metadata.create_all(bind=connection)
+                    for step in MIGRATIONS:
+                        record_version(connection, step)
+                    connection.exec_driver_sql("COMMIT")
+                    return
+                connection.exec_driver_sql("COMMIT")
+                version = 0
+
+            for step in MIGRATIONS:
+                if step.version <= version:
+                    continue
+                logger.info(f"Applying migration {step.version}: {step.description}")
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+                try:
+                    step.apply(connection)
+                    record_version(connection, step)
+                    connection.exec_driver_sql("COMMIT")
+                except Exception:
+                    connection.exec_driver_sql("ROLLBACK")
+                    raise
+            logger.info(f"Database schema migrated to version {latest}")
+        except Exception as e:
+            logger.error(f"Error during migration: {str(e)}")
+            raise
+        finally:
+            dbapi_connection.isolation_level = isolation_level
 
 
 def check_and_update_schema():
     """Function to check and update database schema"""
     try:
-        # Create all tables (will not affect existing tables)
-        Base.metadata.create_all(bind=create_engine(SQLALCHEMY_DATABASE_URL))
-        # Run migrations for existing tables
         run_migrations()
         return True
     except Exception as e:
@@ -51,5 +270,53 @@ def check_and_update_schema():
         return False
 
 
+# Common /sales-history filters that must be answered from an index. A cursor
+# is the (timestamp, id) position decode_sales_cursor() returns, checked as the
+# keyset page query with its limit.
+SALES_FILTER_CHECKS = [
+    {'start_date': '2024-01-01T00:00:00', 'end_date': '2024-01-31T23:59:59'},
+    {'buyer_name': 'jo', 'buyer_match': 'prefix'},
+    {'buyer_name': 'john', 'buyer_match': 'exact'},
+    {'buyer_name': 'jo', 'buyer_match': 'prefix',
+     'start_date': '2024-01-01T00:00:00', 'end_date': '2024-01-31T23:59:59'},
+    {'cursor': (datetime(2024, 1, 15, 12, 0, 0), 50_000), 'limit': 100},
+    {'cursor': (datetime(2024, 1, 15, 12, 0, 0), 50_000), 'limit': 100,
+     'start_date': '2024-01-01T00:00:00', 'end_date': '2024-01-31T23:59:59'},
+]
+
+
+def check_sales_query_plans():
+    """
+    Run EXPLAIN QUERY PLAN over the common sales filters and return the ones
+    that still scan the whole sales table (an empty list means all is well)
+    """
+    from paintstore import apply_sales_filters, apply_sales_cursor
+
+    db = SessionLocal()
+    try:
+        failures = []
+        for args in SALES_FILTER_CHECKS:
+            # Ordered the way /sales-history orders its pages
+            query = apply_sales_filters(db.query(Sale), args).order_by(Sale.timestamp.desc(), Sale.id.desc())
+            if 'cursor' in args:
+                query = apply_sales_cursor(query, args['cursor']).limit(args['limit'] + 1)
+            statement = query.statement.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+            plan = [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {statement}"))]
+            logger.info(f"{args}: {plan}")
+            if any(step.startswith('SCAN') and 'USING' not in step for step in plan):
+                failures.append((args, plan))
+        return failures
+    finally:
+        db.close()
+
+
 if __name__ == "__main__":
-    check_and_update_schema()
\ No newline at end of file
+    import sys
+    logging.basicConfig(level=logging.INFO)
+
+    check_and_update_schema()
+    if '--check-plans' in sys.argv:
+        failures = check_sales_query_plans()
+        for args, plan in failures:
+            logger.error(f"Full table scan for {args}: {plan}")
+        sys.exit(1 if failures else 0)
\ No newline at end of file
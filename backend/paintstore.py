@@ -1,20 +1,134 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from sqlalchemy import insert, tuple_
 from sqlalchemy.orm import Session
-from database import Product, Sale, PaintClass
+from database import Product, Sale, PaintClass, ProductTombstone
+from rollup import record_sales
+from stock import MOVEMENT_KINDS, change_stock, record_movements, stock_as_of
+from catalog import catalog_cache, catalog_changes, next_catalog_version, serialize_product
+from search import search_index
+from events import broadcaster
+from responses import dumps
+from product_io import (request_format, read_product_rows, import_products, export_products,
+                        UploadReadError)
 from datetime import datetime
-import pytz
+import base64
+import functools
+import json
 
 paintstore = Blueprint('paintstore', __name__)
 
 
+@functools.lru_cache(maxsize=None)
+def eat_timezone():
+    """Africa/Nairobi; pytz is imported on first use to keep server startup fast"""
+    import pytz
+    return pytz.timezone('Africa/Nairobi')
+
+
+def escape_like(value):
+    """Escape LIKE wildcards so user input only ever matches literally"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def parse_date_range(args):
+    """Read start_date/end_date as Africa/Nairobi datetimes, or (None, None) if not both given"""
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    if not (start_date and end_date):
+        return None, None
+
+    start = datetime.fromisoformat(start_date)
+    end = datetime.fromisoformat(end_date)
+    if start.tzinfo is None:
+        start = eat_timezone().localize(start)
+    if end.tzinfo is None:
+        end = eat_timezone().localize(end)
+    return start, end
+
+
+def buyer_filter(column, buyer_name, buyer_match='contains'):
+    """
+    Build the buyer_name condition for a sales query.
+    buyer_match picks how buyer_name is matched:
+    - contains (default): case-insensitive substring, always a full scan
+    - prefix: case-insensitive prefix, served by ix_sales_buyer_name_timestamp
+    - exact: case-insensitive equality, served by the same index
+    """
+    if buyer_match == 'exact':
+        return column.collate('NOCASE') == buyer_name
+    if buyer_match == 'prefix':
+        # Plain LIKE is case-insensitive in SQLite and, with a literal prefix,
+        # can range-scan the NOCASE index instead of the whole table.
+        return column.like(f'{escape_like(buyer_name)}%', escape='\\')
+    return column.ilike(f'%{buyer_name}%')
+
+
+def apply_sales_filters(query, args):
+    """Apply the date range and buyer filters shared by the sales endpoints"""
+    start, end = parse_date_range(args)
+    if start is not None:
+        query = query.filter(Sale.timestamp.between(start, end))
+
+    buyer_name = args.get('buyer_name')
+    if buyer_name:
+        query = query.filter(buyer_filter(Sale.buyer_name, buyer_name, args.get('buyer_match', 'contains')))
+
+    return query
+
+
+# Sales are only ever read to be serialized, so they are loaded as column
+# tuples: no ORM instances, identity map or change tracking per row.
+SALE_COLUMNS = (Sale.id, Sale.item_name, Sale.quantity, Sale.buyer_name, Sale.timestamp,
+                Sale.previous_stock, Sale.new_stock)
+
+
+def serialize_sale(sale):
+    """A SALE_COLUMNS row as JSON; unpacked positionally, which is ~4x faster than attribute access"""
+    _, item_name, quantity, buyer_name, timestamp, previous_stock, new_stock = sale
+    return {
+        'item_name': item_name,
+        'quantity': quantity,
+        'buyer_name': buyer_name,  # Include buyer name in response
+        'timestamp': timestamp.isoformat(),
+        'previous_stock': previous_stock,
+        'new_stock': new_stock
+    }
+
+
+def encode_sales_cursor(sale):
+    """Opaque keyset cursor pointing just past the given sale"""
+    raw = json.dumps([sale.timestamp.isoformat(), sale.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_sales_cursor(cursor):
+    """(timestamp, id) from encode_sales_cursor(); ValueError if the cursor isn't one of ours"""
+    try:
+        timestamp, sale_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(timestamp), int(sale_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def apply_sales_cursor(query, position):
+    """Keep the sales after a decode_sales_cursor() position, in (timestamp, id) descending order"""
+    return query.filter(tuple_(Sale.timestamp, Sale.id) < tuple_(*position))
+
+
 def init_routes(db_session):
-    eat_timezone = pytz.timezone('Africa/Nairobi')
+
+    def catalog_response(body, version):
+        """JSON catalog response carrying a strong ETag; answers If-None-Match with 304"""
+        response = Response(body, mimetype='application/json')
+        response.set_etag(f'catalog-{version}')
+        response.headers['X-Catalog-Version'] = str(version)
+        return response.make_conditional(request)
 
     @paintstore.route('/paint-classes', methods=['GET'])
     def get_paint_classes():
         try:
-            classes = db_session.query(PaintClass).all()
-            return jsonify([c.name for c in classes])
+            snapshot = catalog_cache.snapshot(db_session)
+            return catalog_response(snapshot.classes_json, snapshot.version)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
@@ -27,7 +141,8 @@ def init_routes(db_session):
 
             new_class = PaintClass(name=class_name)
             db_session.add(new_class)
-            db_session.commit()
+            version = next_catalog_version(db_session)
+            broadcaster.commit(db_session, version, 'paint_class', {'action': 'added', 'name': class_name})
 
             return jsonify({
                 'success': True,
@@ -46,7 +161,7 @@ def init_routes(db_session):
                 return jsonify({'success': False, 'message': 'Paint class not found'}), 404
 
             #Check if there are any products using this class
-            products_using_class = db_session.query(Product).filter_by(paint_class=class_name).first()
+            products_using_class = db_session.query(Product.id).filter_by(paint_class_id=paint_class.id).first()
             if products_using_class:
                 return jsonify({
                     'success': False,
@@ -54,7 +169,8 @@ def init_routes(db_session):
                 }), 400
 
             db_session.delete(paint_class)
-            db_session.commit()
+            version = next_catalog_version(db_session)
+            broadcaster.commit(db_session, version, 'paint_class', {'action': 'deleted', 'name': class_name})
             return jsonify({'success': True, 'message': 'Paint class deleted successfully'})
         except Exception as e:
             db_session.rollback()
@@ -76,13 +192,14 @@ def init_routes(db_session):
             if existing_class and existing_class.name != class_name:
                 return jsonify({'success': False, 'message': 'Paint class name already exists'}), 400
 
-            # Update all products using this class
-            products = db_session.query(Product).filter_by(paint_class=class_name).all()
-            for product in products:
-                product.paint_class = new_name
-
+            # Products reference the class by id, so this one row is the whole
+            # rename; its version puts them in the next delta sync.
+            version = next_catalog_version(db_session)
             paint_class.name = new_name
-            db_session.commit()
+            paint_class.version = version
+            broadcaster.commit(db_session, version, 'paint_class', {
+                'action': 'renamed', 'name': class_name, 'new_name': new_name
+            })
             return jsonify({'success': True, 'message': 'Paint class updated successfully'})
         except Exception as e:
             db_session.rollback()
@@ -91,13 +208,13 @@ def init_routes(db_session):
     @paintstore.route('/items', methods=['GET'])
     def get_items():
         try:
-            items = db_session.query(Product).all()
-            return jsonify([{
-                'id': item.id,
-                'name': item.name,
-                'stock': item.stock,
-                'class': item.paint_class
-            } for item in items])
+            # Delta sync: only products changed or deleted after the given version
+            since = request.args.get('since', type=int)
+            if since is not None:
+                return jsonify(catalog_changes(db_session, since))
+
+            snapshot = catalog_cache.snapshot(db_session)
+            return catalog_response(snapshot.items_json, snapshot.version)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
@@ -110,33 +227,177 @@ def init_routes(db_session):
 
             if not buyer_name:
                 return jsonify({'success': False, 'message': "Buyer name is required!"})
+            if not isinstance(quantity_to_sell, int) or isinstance(quantity_to_sell, bool) or quantity_to_sell <= 0:
+                return jsonify({'success': False, 'message': "Invalid quantity!"})
+
+            version = next_catalog_version(db_session)
+            changed = change_stock(db_session, name, -quantity_to_sell, version)
+            if changed is None:
+                db_session.rollback()
+                if db_session.query(Product.id).filter_by(name=name).first():
+                    return jsonify({'success': False, 'message': "Not enough stock!"})
+                return jsonify({'success': False, 'message': "Item not found!"})
+            new_stock = changed.stock
+
+            sale = Sale(
+                item_name=name,
+                quantity=quantity_to_sell,
+                buyer_name=buyer_name,  # Add buyer name to sale record
+                timestamp=datetime.now(eat_timezone()),
+                previous_stock=new_stock + quantity_to_sell,
+                new_stock=new_stock
+            )
+            db_session.add(sale)
+            record_sales(db_session, [{
+                'item_name': name,
+                'quantity': quantity_to_sell,
+                'buyer_name': buyer_name,
+                'timestamp': sale.timestamp
+            }])
+            record_movements(db_session, [{
+                'product_id': changed.id,
+                'item_name': name,
+                'kind': 'sale',
+                'quantity': -quantity_to_sell,
+                'previous_stock': sale.previous_stock,
+                'new_stock': new_stock,
+                'timestamp': sale.timestamp
+            }])
+            broadcaster.commit(db_session, version, 'stock', {
+                'items': [{'id': changed.id, 'name': name, 'stock': new_stock}]
+            })
+
+            return jsonify({
+                'success': True,
+                'message': f"Sold {quantity_to_sell} units of {name} to {buyer_name}. New stock: {new_stock}"
+            })
+        except Exception as e:
+            db_session.rollback()
+            return jsonify({'error': str(e)}), 500
 
-            item = db_session.query(Product).filter_by(name=name).first()
-            if item:
-                if quantity_to_sell <= item.stock:
-                    current_stock = item.stock
-                    new_stock = current_stock - quantity_to_sell
-                    item.stock = new_stock
-
-                    sale = Sale(
-                        item_name=name,
-                        quantity=quantity_to_sell,
-                        buyer_name=buyer_name,  # Add buyer name to sale record
-                        timestamp=datetime.now(eat_timezone),
-                        previous_stock=current_stock,
-                        new_stock=new_stock
-                    )
-                    db_session.add(sale)
-                    db_session.commit()
+    @paintstore.route('/sell/batch', methods=['POST'])
+    def sell_batch():
+        """Confirm a whole pending-sales cart in one all-or-nothing transaction"""
+        try:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'success': False, 'message': "Body must be a JSON object"}), 400
+            lines = data.get('items') or []
+            buyer_name = data.get('buyerName')
+
+            # Malformed carts are a client bug, not a sale that failed
+            if not isinstance(lines, list) or not all(
+                    isinstance(line, dict) and isinstance(line.get('name'), str) for line in lines):
+                return jsonify({'success': False, 'message': "items must be a list of objects with a name"}), 400
+            if buyer_name is not None and not isinstance(buyer_name, str):
+                return jsonify({'success': False, 'message': "buyerName must be a string"}), 400
 
+            if not buyer_name:
+                return jsonify({'success': False, 'message': "Buyer name is required!"})
+            if not lines:
+                return jsonify({'success': False, 'message': "No items to sell!"})
+
+            # One IN query for every product in the cart
+            names = {line.get('name') for line in lines}
+            products = {
+                product.name: product
+                for product in db_session.query(Product).filter(Product.name.in_(names)).all()
+            }
+
+            # Track stock as the cart consumes it so repeated lines chain correctly
+            remaining = {name: product.stock for name, product in products.items()}
+            timestamp = datetime.now(eat_timezone())
+            sales = []
+            rejected = []
+
+            for index, line in enumerate(lines):
+                name = line.get('name')
+                quantity = line.get('quantity')
+
+                if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+                    rejected.append({'index': index, 'name': name, 'message': "Invalid quantity!"})
+                elif name not in products:
+                    rejected.append({'index': index, 'name': name, 'message': "Item not found!"})
+                elif quantity > remaining[name]:
+                    rejected.append({'index': index, 'name': name, 'message': "Not enough stock!"})
+                else:
+                    current_stock = remaining[name]
+                    remaining[name] = current_stock - quantity
+                    sales.append({
+                        'item_name': name,
+                        'quantity': quantity,
+                        'buyer_name': buyer_name,
+                        'timestamp': timestamp,
+                        'previous_stock': current_stock,
+                        'new_stock': remaining[name]
+                    })
+
+            if rejected:
+                return jsonify({
+                    'success': False,
+                    'message': f"{len(rejected)} of {len(lines)} items could not be sold. Nothing was sold.",
+                    'rejected': rejected
+                })
+
+            totals = {}
+            for sale in sales:
+                totals[sale['item_name']] = totals.get(sale['item_name'], 0) + sale['quantity']
+
+            # The snapshot above may be stale if another till sold meanwhile, so the
+            # conditional UPDATE has the final say and the stock chain is rebuilt
+            # from the rows it actually changed.
+            running = {}
+            product_ids = {}
+            version = next_catalog_version(db_session)
+            for name, total in totals.items():
+                changed = change_stock(db_session, name, -total, version)
+                if changed is None:
+                    db_session.rollback()
                     return jsonify({
-                        'success': True,
-                        'message': f"Sold {quantity_to_sell} units of {name} to {buyer_name}. New stock: {new_stock}"
+                        'success': False,
+                        'message': f"1 of {len(lines)} items could not be sold. Nothing was sold.",
+                        'rejected': [{
+                            'index': next(i for i, line in enumerate(lines) if line.get('name') == name),
+                            'name': name,
+                            'message': "Not enough stock!"
+                        }]
                     })
-                else:
-                    return jsonify({'success': False, 'message': "Not enough stock!"})
-            else:
-                return jsonify({'success': False, 'message': "Item not found!"})
+                running[name] = changed.stock + total
+                product_ids[name] = changed.id
+
+            for sale in sales:
+                sale['previous_stock'] = running[sale['item_name']]
+                running[sale['item_name']] -= sale['quantity']
+                sale['new_stock'] = running[sale['item_name']]
+
+            db_session.execute(insert(Sale), sales)
+            record_sales(db_session, sales)
+            record_movements(db_session, [{
+                'product_id': product_ids[sale['item_name']],
+                'item_name': sale['item_name'],
+                'kind': 'sale',
+                'quantity': -sale['quantity'],
+                'previous_stock': sale['previous_stock'],
+                'new_stock': sale['new_stock'],
+                'timestamp': timestamp
+            } for sale in sales])
+            broadcaster.commit(db_session, version, 'stock', {
+                'items': [
+                    {'id': product_ids[name], 'name': name, 'stock': stock}
+                    for name, stock in running.items()
+                ]
+            })
+
+            return jsonify({
+                'success': True,
+                'message': f"Sold {len(sales)} items to {buyer_name}",
+                'sold': [{
+                    'name': sale['item_name'],
+                    'quantity': sale['quantity'],
+                    'new_stock': sale['new_stock']
+                } for sale in sales],
+                'rejected': []
+            })
         except Exception as e:
             db_session.rollback()
             return jsonify({'error': str(e)}), 500
@@ -144,48 +405,71 @@ def init_routes(db_session):
     @paintstore.route('/sales-history', methods=['GET'])
     def get_sales_history():
         try:
-            start_date = request.args.get('start_date')
-            end_date = request.args.get('end_date')
-            buyer_name = request.args.get('buyer_name')  # Add buyer name filter option
-
-            query = db_session.query(Sale)
-
-            if start_date and end_date:
-                start = datetime.fromisoformat(start_date)
-                end = datetime.fromisoformat(end_date)
-                if start.tzinfo is None:
-                    start = eat_timezone.localize(start)
-                if end.tzinfo is None:
-                    end = eat_timezone.localize(end)
-                query = query.filter(Sale.timestamp.between(start, end))
-
-            if buyer_name:  # Add filter for buyer name if provided
-                query = query.filter(Sale.buyer_name.ilike(f'%{buyer_name}%'))
-
-            sales = query.order_by(Sale.timestamp.desc()).all()
-
-            return jsonify([{
-                'item_name': sale.item_name,
-                'quantity': sale.quantity,
-                'buyer_name': sale.buyer_name,  # Include buyer name in response
-                'timestamp': sale.timestamp.isoformat(),
-                'previous_stock': sale.previous_stock,
-                'new_stock': sale.new_stock
-            } for sale in sales])
+            query = apply_sales_filters(db_session.query(*SALE_COLUMNS), request.args)
+            query = query.order_by(Sale.timestamp.desc(), Sale.id.desc())
+
+            # Opt-in streaming: rows are fetched in chunks and written out one by
+            # one, so memory stays flat however long the history is.
+            stream = request.args.get('stream')
+            if stream in ('ndjson', 'json'):
+                def generate():
+                    if stream == 'json':
+                        yield b'['
+                    for index, sale in enumerate(query.yield_per(1000)):
+                        row = dumps(serialize_sale(sale))
+                        if stream == 'json':
+                            yield row if index == 0 else b',' + row
+                        else:
+                            yield row + b'\n'
+                    if stream == 'json':
+                        yield b']'
+
+                mimetype = 'application/x-ndjson' if stream == 'ndjson' else 'application/json'
+                return Response(stream_with_context(generate()), mimetype=mimetype)
+
+            # Keyset pagination on (timestamp, id): each page is an index range
+            # scan, no matter how deep into the history it is.
+            limit = request.args.get('limit', type=int)
+            if limit:
+                limit = max(1, min(limit, 1000))
+                cursor = request.args.get('cursor')
+                if cursor:
+                    try:
+                        position = decode_sales_cursor(cursor)
+                    except ValueError:
+                        return jsonify({'error': 'Invalid cursor'}), 400
+                    query = apply_sales_cursor(query, position)
+
+                sales = query.limit(limit + 1).all()
+                has_more = len(sales) > limit
+                sales = sales[:limit]
+                return jsonify({
+                    'sales': [serialize_sale(sale) for sale in sales],
+                    'next_cursor': encode_sales_cursor(sales[-1]) if has_more else None
+                })
+
+            sales = query.all()
+            return jsonify([serialize_sale(sale) for sale in sales])
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
     @paintstore.route('/search', methods=['GET'])
     def search_items():
+        """Ranked, typo-tolerant product name search; ?q=&limit=&class="""
         try:
             query = request.args.get('q', '')
-            results = db_session.query(Product).filter(
-                Product.name.ilike(f'%{query}%')
-            ).all()
-            return jsonify([item.name for item in results])
+            limit = max(1, min(request.args.get('limit', 20, type=int), 500))
+            paint_class = request.args.get('class')
+
+            snapshot = catalog_cache.snapshot(db_session)
+            return jsonify(search_index(snapshot).search(query, limit=limit, paint_class=paint_class))
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    @paintstore.route('/admin/catalog-cache', methods=['GET'])
+    def get_catalog_cache_stats():
+        return jsonify(catalog_cache.stats())
+
     @paintstore.route('/admin/products', methods=['POST'])
     def add_product():
         try:
@@ -200,10 +484,27 @@ def init_routes(db_session):
             new_product = Product(
                 name=data['name'],
                 stock=data['stock'],
-                paint_class=data['class']
+                paint_class_id=class_exists.id,
+                version=next_catalog_version(db_session)
             )
             db_session.add(new_product)
-            db_session.commit()
+            db_session.flush()
+            # SQLite may hand out a deleted product's id again
+            db_session.query(ProductTombstone).filter_by(id=new_product.id).delete()
+            if new_product.stock:
+                record_movements(db_session, [{
+                    'product_id': new_product.id,
+                    'item_name': new_product.name,
+                    'kind': 'adjustment',
+                    'quantity': new_product.stock,
+                    'previous_stock': 0,
+                    'new_stock': new_product.stock,
+                    'timestamp': datetime.now(eat_timezone()),
+                    'note': 'Opening stock'
+                }])
+            broadcaster.commit(
+                db_session, new_product.version, 'product', serialize_product(new_product, class_exists.name)
+            )
 
             return jsonify({
                 'success': True,
@@ -214,32 +515,184 @@ def init_routes(db_session):
             db_session.rollback()
             return jsonify({'success': False, 'message': str(e)}), 400
 
+    @paintstore.route('/admin/products/import', methods=['POST'])
+    def import_product_list():
+        fmt = request_format(request.args, request.content_type)
+        if fmt is None:
+            return jsonify({'success': False, 'message': 'format must be csv, json or ndjson'}), 400
+        upload = request.files.get('file')
+        stream = upload.stream if upload else request.stream
+        try:
+            result = import_products(db_session, read_product_rows(stream, fmt), datetime.now(eat_timezone()))
+        except UploadReadError as e:
+            # Batches before the unreadable part are committed; say so rather than imply nothing changed
+            imported = e.result['created'] + e.result['updated']
+            message = f'Could not read {fmt} upload: {e}'
+            if imported:
+                message += f'. {imported} products from earlier rows were already imported'
+            return jsonify({'success': False, 'message': message, **e.result}), 400
+        except Exception as e:
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+        return jsonify({
+            'success': not result['errors'],
+            'message': f"Imported {result['created'] + result['updated']} products, "
+                       f"{len(result['errors'])} rows rejected",
+            **result
+        })
+
+    @paintstore.route('/admin/products/export', methods=['GET'])
+    def export_product_list():
+        fmt = request.args.get('format', 'csv')
+        if fmt not in ('csv', 'json', 'ndjson'):
+            return jsonify({'success': False, 'message': 'format must be csv, json or ndjson'}), 400
+        mimetype = {'csv': 'text/csv', 'json': 'application/json', 'ndjson': 'application/x-ndjson'}[fmt]
+        response = Response(stream_with_context(export_products(db_session, fmt)), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename=products.{fmt}'
+        return response
+
     @paintstore.route('/admin/products/<int:product_id>', methods=['PUT'])
     def update_product(product_id):
         try:
             data = request.json
+            # Claim the version first so the stock read below is under the write lock
+            version = next_catalog_version(db_session)
             product = db_session.query(Product).get(product_id)
 
             if not product:
+                db_session.rollback()
                 return jsonify({'success': False, 'message': 'Product not found'}), 404
 
             if 'class' in data:
                 class_exists = db_session.query(PaintClass).filter_by(name=data['class']).first()
                 if not class_exists:
+                    db_session.rollback()
                     return jsonify({'success': False, 'message': 'Invalid paint class'}), 400
-                product.paint_class = data['class']
+                product.paint_class_id = class_exists.id
 
             if 'name' in data:
                 product.name = data['name']
-            if 'stock' in data:
+            if 'stock' in data and data['stock'] != product.stock:
+                record_movements(db_session, [{
+                    'product_id': product.id,
+                    'item_name': product.name,
+                    'kind': 'adjustment',
+                    'quantity': data['stock'] - product.stock,
+                    'previous_stock': product.stock,
+                    'new_stock': data['stock'],
+                    'timestamp': datetime.now(eat_timezone())
+                }])
                 product.stock = data['stock']
 
-            db_session.commit()
+            product.version = version
+            paint_class = db_session.get(PaintClass, product.paint_class_id) if product.paint_class_id else None
+            broadcaster.commit(
+                db_session, version, 'product', serialize_product(product, paint_class.name if paint_class else None)
+            )
             return jsonify({'success': True, 'message': 'Product updated successfully'})
         except Exception as e:
             db_session.rollback()
             return jsonify({'success': False, 'message': str(e)}), 400
 
+    @paintstore.route('/admin/restock', methods=['POST'])
+    def restock():
+        """Apply a delivery, returns or stock-take corrections in one all-or-nothing transaction"""
+        try:
+            lines = (request.json or {}).get('items') or []
+            if not lines:
+                return jsonify({'success': False, 'message': "No items to restock!"}), 400
+
+            rejected = []
+            for index, line in enumerate(lines):
+                kind = line.get('kind', 'restock')
+                quantity = line.get('quantity')
+                if kind not in MOVEMENT_KINDS or kind == 'sale':
+                    rejected.append({'index': index, 'name': line.get('name'), 'message': "Invalid kind!"})
+                elif not isinstance(quantity, int) or isinstance(quantity, bool) or quantity == 0 \
+                        or (kind != 'adjustment' and quantity < 0):
+                    rejected.append({'index': index, 'name': line.get('name'), 'message': "Invalid quantity!"})
+            if rejected:
+                return jsonify({
+                    'success': False,
+                    'message': f"{len(rejected)} of {len(lines)} items were invalid. Nothing was changed.",
+                    'rejected': rejected
+                }), 400
+
+            timestamp = datetime.now(eat_timezone())
+            version = next_catalog_version(db_session)
+            movements = []
+            for index, line in enumerate(lines):
+                name = line.get('name')
+                changed = change_stock(db_session, name, line['quantity'], version)
+                if changed is None:
+                    exists = db_session.query(Product.id).filter_by(name=name).first()
+                    db_session.rollback()
+                    return jsonify({
+                        'success': False,
+                        'message': f"1 of {len(lines)} items could not be applied. Nothing was changed.",
+                        'rejected': [{
+                            'index': index,
+                            'name': name,
+                            'message': "Not enough stock!" if exists else "Item not found!"
+                        }]
+                    }), 400
+                movements.append({
+                    'product_id': changed.id,
+                    'item_name': name,
+                    'kind': line.get('kind', 'restock'),
+                    'quantity': line['quantity'],
+                    'previous_stock': changed.stock - line['quantity'],
+                    'new_stock': changed.stock,
+                    'timestamp': timestamp,
+                    'note': line.get('note')
+                })
+
+            record_movements(db_session, movements)
+            broadcaster.commit(db_session, version, 'stock', {
+                'items': list({
+                    movement['item_name']: {
+                        'id': movement['product_id'],
+                        'name': movement['item_name'],
+                        'stock': movement['new_stock']
+                    } for movement in movements
+                }.values())
+            })
+
+            return jsonify({
+                'success': True,
+                'message': f"Applied {len(movements)} stock movements",
+                'applied': [{
+                    'name': movement['item_name'],
+                    'kind': movement['kind'],
+                    'quantity': movement['quantity'],
+                    'new_stock': movement['new_stock']
+                } for movement in movements]
+            })
+        except Exception as e:
+            db_session.rollback()
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+    @paintstore.route('/admin/stock', methods=['GET'])
+    def get_stock_as_of():
+        """Stock of every product at ?as_of= (Africa/Nairobi time), from the nearest checkpoint"""
+        try:
+            as_of = request.args.get('as_of')
+            if not as_of:
+                return jsonify({'success': False, 'message': 'as_of is required'}), 400
+            when = datetime.fromisoformat(as_of)
+            if when.tzinfo is not None:
+                when = when.astimezone(eat_timezone())
+            return jsonify([
+                {'id': product_id, 'name': name, 'stock': stock}
+                for product_id, name, stock in stock_as_of(db_session, when)
+            ])
+        except ValueError as e:
+            db_session.rollback()
+            return jsonify({'success': False, 'message': str(e)}), 400
+        except Exception as e:
+            db_session.rollback()
+            return jsonify({'success': False, 'message': str(e)}), 500
+
     @paintstore.route('/admin/products/<int:product_id>', methods=['DELETE'])
     def delete_product(product_id):
         try:
@@ -247,8 +700,10 @@ def init_routes(db_session):
             if not product:
                 return jsonify({'success': False, 'message': 'Product not found'}), 404
 
+            version = next_catalog_version(db_session)
+            db_session.merge(ProductTombstone(id=product.id, name=product.name, version=version))
             db_session.delete(product)
-            db_session.commit()
+            broadcaster.commit(db_session, version, 'product_deleted', {'id': product.id, 'name': product.name})
             return jsonify({'success': True, 'message': 'Product deleted successfully'})
         except Exception as e:
             db_session.rollback()
@@ -0,0 +1,197 @@
+from database import Product, PaintClass, ProductTombstone
+from catalog import next_catalog_version, product_query
+from stock import record_movements
+from events import broadcaster
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+import csv
+import io
+import json
+
+IMPORT_BATCH_SIZE = 5000
+EXPORT_COLUMNS = ['id', 'name', 'stock', 'class']
+FORMATS = ('csv', 'json', 'ndjson')
+
+
+class UploadReadError(ValueError):
+    """
+    The upload stopped parsing part way. result holds what the batches
+    committed before that point imported, in import_products()'s shape.
+    """
+
+    def __init__(self, message, result):
+        super().__init__(message)
+        self.result = result
+
+
+def request_format(args, content_type):
+    """Format from ?format=, falling back to the Content-Type, then JSON"""
+    fmt = args.get('format')
+    if fmt:
+        return fmt if fmt in FORMATS else None
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'ndjson' in content_type:
+        return 'ndjson'
+    return 'json'
+
+
+def read_product_rows(stream, fmt):
+    """
+    Yield (row number, record) from an uploaded CSV, JSON array or NDJSON body.
+    CSV and NDJSON are read as they arrive; a JSON array is parsed whole.
+    An unreadable body raises ValueError.
+    """
+    if fmt == 'csv':
+        text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        try:
+            for number, record in enumerate(csv.DictReader(text_stream), start=1):
+                yield number, record
+        except csv.Error as e:
+            raise ValueError(str(e)) from e
+    elif fmt == 'ndjson':
+        number = 0
+        for line in stream:
+            if line.strip():
+                number += 1
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    yield number, None
+    else:
+        records = json.load(stream)
+        if isinstance(records, dict):
+            records = records.get('products', [])
+        for number, record in enumerate(records, start=1):
+            yield number, record
+
+
+def validate_product(record, paint_classes):
+    """
+    Return (values, None) for a good record or (None, error message).
+    paint_classes maps class names to their ids.
+    """
+    if not isinstance(record, dict):
+        return None, 'Row is not an object'
+    name = str(record.get('name') or '').strip()
+    if not name:
+        return None, 'Missing name'
+    try:
+        stock = int(record.get('stock'))
+    except (TypeError, ValueError):
+        return None, 'Stock must be a whole number'
+    if stock < 0:
+        return None, 'Stock cannot be negative'
+    paint_class = str(record.get('class') or record.get('paint_class') or '').strip()
+    if paint_class not in paint_classes:
+        return None, f"Invalid paint class '{paint_class}'"
+    return {'name': name, 'stock': stock, 'paint_class_id': paint_classes[paint_class]}, None
+
+
+def import_products(db_session, rows, timestamp, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Upsert products by name from (row number, record) pairs, committing every
+    batch_size rows with one INSERT ... ON CONFLICT per batch. Paint classes are
+    loaded once up front. Stock changes are written to the stock ledger as
+    adjustments. Bad rows are skipped and reported.
+    If the upload can't be read part way, the uncommitted batch is dropped and
+    UploadReadError carries the counts of the batches already committed.
+    """
+    paint_classes = dict(db_session.execute(select(PaintClass.name, PaintClass.id)).all())
+    result = {'created': 0, 'updated': 0, 'errors': [], 'version': None}
+    batch = {}
+
+    def flush():
+        # Claiming the version takes the write lock, so the stock read next is current
+        version = next_catalog_version(db_session)
+        names = list(batch)
+        previous = {}
+        for start in range(0, len(names), 500):
+            previous.update(db_session.execute(
+                select(Product.name, Product.stock).where(Product.name.in_(names[start:start + 500]))
+            ).all())
+
+        statement = insert(Product).values(version=version)
+        db_session.execute(statement.on_conflict_do_update(
+            index_elements=['name'],
+            set_={
+                'stock': statement.excluded.stock,
+                'paint_class_id': statement.excluded.paint_class_id,
+                'version': statement.excluded.version
+            }
+        ), list(batch.values()))
+        # SQLite may hand out a deleted product's id again
+        db_session.execute(delete(ProductTombstone).where(
+            ProductTombstone.id.in_(select(Product.id).where(Product.version == version))
+        ))
+        record_movements(db_session, [{
+            'product_id': product_id,
+            'item_name': name,
+            'kind': 'adjustment',
+            'quantity': stock - previous.get(name, 0),
+            'previous_stock': previous.get(name, 0),
+            'new_stock': stock,
+            'timestamp': timestamp,
+            'note': 'Import'
+        } for product_id, name, stock in db_session.execute(
+            select(Product.id, Product.name, Product.stock).where(Product.version == version)
+        ) if stock != previous.get(name, 0)])
+        # Too many rows for one event; clients pull the batch with /items?since=
+        broadcaster.commit(db_session, version, 'catalog', {'version': version})
+
+        result['created'] += len(batch) - len(previous)
+        result['updated'] += len(previous)
+        result['version'] = version
+        batch.clear()
+
+    try:
+        for number, record in rows:
+            values, error = validate_product(record, paint_classes)
+            if error:
+                name = record.get('name') if isinstance(record, dict) else None
+                result['errors'].append({'row': number, 'name': name, 'message': error})
+                continue
+            # A name repeated within the file keeps its last row
+            batch.pop(values['name'], None)
+            batch[values['name']] = values
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    except ValueError as e:
+        db_session.rollback()
+        raise UploadReadError(str(e), result) from e
+    except Exception:
+        db_session.rollback()
+        raise
+    return result
+
+
+def export_products(db_session, fmt):
+    """Yield the catalog as CSV, a JSON array or NDJSON, a chunk of rows at a time"""
+    query = product_query(db_session).order_by(Product.id).yield_per(1000)
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for index, row in enumerate(query, start=1):
+            writer.writerow(row)
+            if index % 1000 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+        return
+
+    if fmt == 'json':
+        yield '['
+    for index, row in enumerate(query):
+        line = json.dumps(dict(zip(EXPORT_COLUMNS, row)))
+        if fmt == 'json':
+            yield line if index == 0 else ',' + line
+        else:
+            yield line + '\n'
+    if fmt == 'json':
+        yield ']'
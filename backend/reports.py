@@ -0,0 +1,127 @@
+from flask import Blueprint, request, jsonify
+from sqlalchemy import func
+from database import Product, PaintClass, Sale, DailySalesRollup
+from paintstore import apply_sales_filters, buyer_filter, eat_timezone, parse_date_range
+from rollup import rollup_covers
+from datetime import datetime
+
+reports_routes = Blueprint('reports', __name__)
+
+GROUPINGS = ['day', 'week', 'month', 'item', 'paint_class', 'buyer']
+
+
+def sales_groupings(model, date_column):
+    """Grouping dimensions for /reports/sales as SQL expressions over model"""
+    return {
+        'day': func.strftime('%Y-%m-%d', date_column),
+        'week': func.strftime('%Y-W%W', date_column),
+        'month': func.strftime('%Y-%m', date_column),
+        'item': model.item_name,
+        'paint_class': func.coalesce(PaintClass.name, 'Unknown'),
+        'buyer': model.buyer_name,
+    }
+
+
+def init_report_routes(db_session):
+    def raw_sales_query(group_by, args):
+        columns = [sales_groupings(Sale, Sale.timestamp)[g].label(g) for g in group_by]
+        query = db_session.query(
+            *columns,
+            func.sum(Sale.quantity).label('quantity'),
+            func.count(Sale.id).label('transactions')
+        ).select_from(Sale)
+        if 'paint_class' in group_by:
+            query = query.outerjoin(Product, Product.name == Sale.item_name).outerjoin(
+                PaintClass, Product.paint_class_id == PaintClass.id
+            )
+        query = apply_sales_filters(query, args)
+        return query.group_by(*columns).order_by(*columns)
+
+    def rollup_sales_query(group_by, args, start, end):
+        columns = [sales_groupings(DailySalesRollup, DailySalesRollup.date)[g].label(g) for g in group_by]
+        query = db_session.query(
+            *columns,
+            func.sum(DailySalesRollup.quantity).label('quantity'),
+            func.sum(DailySalesRollup.transactions).label('transactions')
+        ).select_from(DailySalesRollup)
+        if 'paint_class' in group_by:
+            query = query.outerjoin(Product, Product.name == DailySalesRollup.item_name).outerjoin(
+                PaintClass, Product.paint_class_id == PaintClass.id
+            )
+        if start is not None:
+            query = query.filter(DailySalesRollup.date.between(
+                start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+            ))
+        buyer_name = args.get('buyer_name')
+        if buyer_name:
+            query = query.filter(
+                buyer_filter(DailySalesRollup.buyer_name, buyer_name, args.get('buyer_match', 'contains'))
+            )
+        return query.group_by(*columns).order_by(*columns)
+
+    @reports_routes.route('/sales', methods=['GET'])
+    def sales_report():
+        """
+        Sales totals grouped by any of day/week/month, item, paint_class and buyer,
+        e.g. ?group_by=day,item. Honors the /sales-history date and buyer filters.
+        Served from the daily rollup whenever the date range is whole days;
+        pass source=raw to aggregate the sales ledger instead.
+        """
+        try:
+            group_by = [g for g in request.args.get('group_by', 'day').split(',') if g]
+            unknown = [g for g in group_by if g not in GROUPINGS]
+            if unknown or not group_by:
+                return jsonify({
+                    'error': f"Invalid group_by: {', '.join(unknown)}",
+                    'allowed': GROUPINGS
+                }), 400
+
+            start, end = parse_date_range(request.args)
+            if request.args.get('source') != 'raw' and rollup_covers(start, end):
+                query = rollup_sales_query(group_by, request.args, start, end)
+            else:
+                query = raw_sales_query(group_by, request.args)
+
+            return jsonify([{
+                **{g: getattr(row, g) for g in group_by},
+                'quantity': row.quantity or 0,
+                'transactions': row.transactions
+            } for row in query.all()])
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @reports_routes.route('/reorder', methods=['GET'])
+    def reorder_report():
+        """
+        Demand forecast, days of cover and suggested reorder quantity for every
+        product, those running out soonest first. Forecast parameters can be
+        overridden in the query string; ?reorder=1 lists only products at or
+        below their reorder point. Cached until the next sale or stock change.
+        """
+        try:
+            # NumPy is only loaded when a forecast is first asked for
+            from forecast import DEFAULT_PARAMS, ForecastParams, reorder_cache
+        except ImportError:
+            return jsonify({'error': 'Forecasting requires numpy to be installed'}), 501
+
+        try:
+            settings = {
+                name: request.args.get(name, default, type=type(default))
+                for name, default in DEFAULT_PARAMS.items()
+            }
+            if settings['history_days'] < 1 or settings['average_days'] < 1 or not 0 < settings['alpha'] <= 1:
+                return jsonify({'error': 'history_days and average_days must be positive and alpha in (0, 1]'}), 400
+            params = ForecastParams(
+                today=datetime.now(eat_timezone()).date(),
+                source='raw' if request.args.get('source') == 'raw' else 'rollup',
+                **settings
+            )
+
+            report = reorder_cache.get(db_session, params)
+            if request.args.get('reorder') in ('1', 'true'):
+                report = [row for row in report if row['reorder']]
+            return jsonify(report)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    return reports_routes
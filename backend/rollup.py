@@ -0,0 +1,162 @@
+from database import SessionLocal, Sale, DailySalesRollup, SalesArchiveState, logging
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.sqlite import insert
+from datetime import datetime
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Written as text and run once per row: SQLAlchemy can't cache a compiled
+# ON CONFLICT statement, and a multi-row VALUES list compiles per cart size
+ADD_TO_ROLLUP = text(
+    "INSERT INTO daily_sales_rollup (date, item_name, buyer_name, quantity, transactions) "
+    "VALUES (:date, :item_name, :buyer_name, :quantity, :transactions) "
+    "ON CONFLICT (date, item_name, buyer_name) DO UPDATE SET "
+    "quantity = daily_sales_rollup.quantity + excluded.quantity, "
+    "transactions = daily_sales_rollup.transactions + excluded.transactions"
+)
+
+
+def record_sales(db_session, sales):
+    """
+    Add sales to the daily rollup inside the caller's transaction.
+    sales is an iterable of dicts with item_name, quantity, buyer_name and an
+    Africa/Nairobi timestamp, i.e. the same values written to the sales table.
+    """
+    totals = {}
+    for sale in sales:
+        key = (sale['timestamp'].strftime('%Y-%m-%d'), sale['item_name'], sale['buyer_name'])
+        quantity, transactions = totals.get(key, (0, 0))
+        totals[key] = (quantity + sale['quantity'], transactions + 1)
+
+    if not totals:
+        return
+
+    db_session.execute(ADD_TO_ROLLUP, [{
+        'date': date,
+        'item_name': item_name,
+        'buyer_name': buyer_name,
+        'quantity': quantity,
+        'transactions': transactions
+    } for (date, item_name, buyer_name), (quantity, transactions) in totals.items()])
+
+
+def archived_before(db):
+    """
+    Day before which sales have been archived out of the live table, or None.
+    The rollup keeps those days, but they can no longer be recomputed from the ledger.
+    """
+    # Migration 3 backfills the rollup before migration 5 creates the archive state table
+    if db.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sales_archive_state'"
+    )).first() is None:
+        return None
+    state = db.get(SalesArchiveState, 1)
+    return state.archived_before if state else None
+
+
+def ledger_totals_query(since=None):
+    """The rollup's rows recomputed from the raw sales ledger, optionally from a day onwards"""
+    query = select(
+        func.date(Sale.timestamp).label('date'),
+        Sale.item_name,
+        func.coalesce(Sale.buyer_name, 'Unknown').label('buyer_name'),
+        func.sum(Sale.quantity).label('quantity'),
+        func.count(Sale.id).label('transactions')
+    ).group_by(
+        func.date(Sale.timestamp), Sale.item_name, func.coalesce(Sale.buyer_name, 'Unknown')
+    )
+    if since is not None:
+        query = query.where(Sale.timestamp >= datetime.strptime(since, '%Y-%m-%d'))
+    return query
+
+
+def rebuild_daily_rollup(db):
+    """
+    Rebuild the rollup from the sales history in one transaction, leaving
+    archived days alone. Returns the number of rollup rows.
+    """
+    since = archived_before(db)
+    rollup = db.query(DailySalesRollup)
+    if since is not None:
+        rollup = rollup.filter(DailySalesRollup.date >= since)
+    rollup.delete(synchronize_session=False)
+    totals = ledger_totals_query(since)
+    db.execute(
+        insert(DailySalesRollup).from_select(
+            ['date', 'item_name', 'buyer_name', 'quantity', 'transactions'], totals
+        )
+    )
+    db.commit()
+    count = db.query(DailySalesRollup).count()
+    logger.info(f"Rebuilt daily sales rollup with {count} rows")
+    return count
+
+
+def backfill_if_empty(db):
+    """Populate a freshly created rollup table from existing sales history"""
+    rollup_empty = db.execute(text("SELECT 1 FROM daily_sales_rollup LIMIT 1")).first() is None
+    sales_exist = db.execute(text("SELECT 1 FROM sales LIMIT 1")).first() is not None
+    if rollup_empty and sales_exist:
+        logger.info("Backfilling daily sales rollup from sales history...")
+        rebuild_daily_rollup(db)
+
+
+def check_daily_rollup(db):
+    """
+    Compare the rollup with the raw sales ledger, skipping archived days.
+    Returns a list of (date, item_name, buyer_name, ledger, rollup) mismatches,
+    where ledger and rollup are (quantity, transactions) or None if missing.
+    """
+    since = archived_before(db)
+    ledger = {
+        (row.date, row.item_name, row.buyer_name): (row.quantity, row.transactions)
+        for row in db.execute(ledger_totals_query(since))
+    }
+    rollup_rows = db.query(DailySalesRollup)
+    if since is not None:
+        rollup_rows = rollup_rows.filter(DailySalesRollup.date >= since)
+    rollup = {
+        (row.date, row.item_name, row.buyer_name): (row.quantity, row.transactions)
+        for row in rollup_rows
+    }
+    return [
+        (*key, ledger.get(key), rollup.get(key))
+        for key in sorted(ledger.keys() | rollup.keys())
+        if ledger.get(key) != rollup.get(key)
+    ]
+
+
+def rollup_covers(start, end):
+    """The rollup only has whole days, so it can serve a date range only if it is day-aligned"""
+    if start is None and end is None:
+        return True
+    if start is None or end is None:
+        return False
+    return start.time() == datetime.min.time() and end.time() in (
+        datetime.max.time(), datetime.max.time().replace(microsecond=0)
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    db = SessionLocal()
+    try:
+        if command == 'rebuild':
+            count = rebuild_daily_rollup(db)
+            print(f"Rebuilt daily sales rollup with {count} rows")
+        elif command == 'check':
+            mismatches = check_daily_rollup(db)
+            for date, item_name, buyer_name, ledger, rollup in mismatches:
+                print(f"{date} {item_name} {buyer_name}: ledger={ledger} rollup={rollup}")
+            print(f"{len(mismatches)} mismatched rollup rows")
+            sys.exit(1 if mismatches else 0)
+        else:
+            print("Usage: python rollup.py [rebuild|check]")
+            sys.exit(2)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+    finally:
+        db.close()
@@ -0,0 +1,111 @@
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from itertools import chain
+import heapq
+import math
+import threading
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def trigrams(text):
+    """pg_trgm-style trigrams: each word padded so word starts weigh more"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index over product names for ranked prefix, substring and
+    typo-tolerant ("emulsoin") search. Built from a catalog snapshot and reused
+    for as long as names and classes stay the same, i.e. until the snapshot's
+    names_version moves.
+    """
+
+    # Share of the query's trigrams a name must contain to count as a fuzzy match
+    MIN_SIMILARITY = 0.5
+
+    def __init__(self, entries, names_version=None):
+        self.entries = entries  # tuple of (id, name, paint_class)
+        self.names_version = names_version
+        self.folded = [normalize(name) for _, name, _ in entries]
+        self.postings = defaultdict(list)
+        for position, folded in enumerate(self.folded):
+            for gram in trigrams(folded):
+                self.postings[gram].append(position)
+
+        # All names in one string, so substring hits are found by str.find in C
+        self.haystack = '\n'.join(self.folded)
+        self.starts = []
+        offset = 0
+        for folded in self.folded:
+            self.starts.append(offset)
+            offset += len(folded) + 1
+
+    def substring_hits(self, query):
+        hits = set()
+        offset = self.haystack.find(query)
+        while offset != -1:
+            position = bisect_right(self.starts, offset) - 1
+            hits.add(position)
+            # Skip to the next name; one hit per name is enough
+            next_start = self.starts[position + 1] if position + 1 < len(self.starts) else len(self.haystack)
+            offset = self.haystack.find(query, next_start)
+        return hits
+
+    def search(self, query, limit=20, paint_class=None):
+        """Names ranked exact > prefix > word prefix > substring > fuzzy similarity"""
+        query = normalize(query)
+        if not query:
+            positions = range(len(self.entries))
+            if paint_class:
+                positions = (p for p in positions if self.entries[p][2] == paint_class)
+            return [self.entries[p][1] for p in heapq.nsmallest(limit, positions, key=self.folded.__getitem__)]
+
+        query_grams = trigrams(query)
+        shared = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in query_grams))
+        needed = math.ceil(self.MIN_SIMILARITY * len(query_grams))
+        candidates = self.substring_hits(query)
+        candidates.update(position for position, count in shared.items() if count >= needed)
+
+        ranked = []
+        for position in candidates:
+            if paint_class and self.entries[position][2] != paint_class:
+                continue
+            folded = self.folded[position]
+            if folded == query:
+                tier = 4
+            elif folded.startswith(query):
+                tier = 3
+            elif f' {query}' in folded:
+                tier = 2
+            elif query in folded:
+                tier = 1
+            else:
+                tier = 0
+            similarity = shared.get(position, 0) / len(query_grams)
+            ranked.append((tier, similarity, -len(folded), -position))
+
+        best = heapq.nlargest(limit, ranked)
+        return [self.entries[-position][1] for *_, position in best]
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def search_index(snapshot):
+    """Trigram index for a catalog snapshot, rebuilt only when names or classes changed"""
+    global _index
+    index = _index
+    if index is not None and index.names_version == snapshot.names_version:
+        return index
+    with _lock:
+        if _index is None or _index.names_version != snapshot.names_version:
+            _index = TrigramIndex(snapshot.entries, snapshot.names_version)
+        return _index
@@ -0,0 +1,136 @@
+"""
+Production entry point: the app on waitress, a multi-threaded WSGI server
+that runs on Windows as well as Linux.
+
+    python serve.py
+
+Settings come from the environment: HOST (default 0.0.0.0 so tills on the
+LAN can connect), PORT, SERVER_THREADS, SERVER_CONNECTION_LIMIT,
+SERVER_KEEPALIVE_SECONDS and SHUTDOWN_TIMEOUT. On SIGTERM or Ctrl+C the server
+stops accepting connections, lets in-flight requests finish (up to
+SHUTDOWN_TIMEOUT seconds) and then exits.
+
+The backup service, caches and token cache live in the process, so run a
+single process and scale with threads. Under gunicorn that means
+`gunicorn --workers 1 --threads 32 'server:create_app()'`.
+"""
+from werkzeug.wsgi import ClosingIterator
+import logging
+import os
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', 5000))
+# Each open /api/events stream holds a thread, on top of ordinary requests
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 32))
+SERVER_CONNECTION_LIMIT = int(os.environ.get('SERVER_CONNECTION_LIMIT', 200))
+# Idle keep-alive connections are closed after this many seconds
+SERVER_KEEPALIVE_SECONDS = int(os.environ.get('SERVER_KEEPALIVE_SECONDS', 30))
+SHUTDOWN_TIMEOUT = float(os.environ.get('SHUTDOWN_TIMEOUT', 15))
+
+
+class RequestTracker:
+    """
+    WSGI middleware counting requests in flight, until their response body
+    has been fully sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.active = 0
+        self.draining = False
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.active += 1
+
+        try:
+            return ClosingIterator(self.app(environ, start_response), [self._finished])
+        except BaseException:
+            self._finished()
+            raise
+
+    def _finished(self):
+        with self._lock:
+            self.active -= 1
+            if self.active == 0:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout):
+        """Wait until no request is in flight; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self.active:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+
+def serve(app, host=HOST, port=PORT, threads=SERVER_THREADS):
+    from waitress import create_server, wasyncore
+
+    tracker = RequestTracker(app)
+    server = create_server(
+        tracker,
+        host=host,
+        port=port,
+        threads=threads,
+        connection_limit=SERVER_CONNECTION_LIMIT,
+        channel_timeout=SERVER_KEEPALIVE_SECONDS,
+        ident='paintstore'
+    )
+
+    # Sockets are only touched from the event loop, through its trigger
+    def stop_accepting():
+        # Open connections keep being served until drained
+        server.accepting = False
+        server.del_channel()
+        server.socket.close()
+
+    def stop():
+        # Closing every channel, idle keep-alive ones included, ends the event loop
+        wasyncore.close_all(server._map)
+
+    def drain():
+        server.trigger.pull_trigger(stop_accepting)
+        for hook in getattr(app, 'extensions', {}).get('on_shutdown', []):
+            hook()
+        if not tracker.wait_idle(SHUTDOWN_TIMEOUT):
+            logger.warning(f"Shutting down with {tracker.active} requests still running")
+        # Let the event loop flush the last responses before it stops
+        time.sleep(0.1)
+        server.trigger.pull_trigger(stop)
+
+    def shutdown(signum, frame):
+        if tracker.draining:
+            return
+        logger.info(f"Received signal {signum}, draining {tracker.active} in-flight requests")
+        tracker.draining = True
+        threading.Thread(target=drain, name='shutdown-drain', daemon=True).start()
+
+    for name in ('SIGTERM', 'SIGINT', 'SIGBREAK'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), shutdown)
+
+    logger.info(f"Serving on http://{host}:{port} with {threads} threads")
+    server.run()
+    server.task_dispatcher.shutdown()
+    logger.info("Server stopped")
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    from log_config import setup_logging
+    from server import create_app
+
+    multiprocessing.freeze_support()
+    setup_logging()
+    serve(create_app())
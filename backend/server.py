@@ -1,138 +1,54 @@
 import os
 import sys
 
-# Debug prints to understand our environment
-current_dir = os.path.dirname(os.path.abspath(__file__))
-print(f"Current directory: {current_dir}")
-print(f"Files in current directory: {os.listdir(current_dir)}")
-print(f"Python path: {sys.path}")
-
 # Add the current directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 from flask_cors import CORS
-from flask import Flask, request
-from database import get_db, engine, Base, User
+from flask import Flask, g, request, jsonify
+from database import get_db, engine, User, db_session, remove_session
+from migrations import run_migrations
 from auth import init_auth_routes
 from paintstore import init_routes
+from reports import init_report_routes
+from backup import BackupService, init_backup_routes
+from archive import ArchiveJob, init_archive_routes
+from events import broadcaster, init_event_routes
+from stock import CheckpointService
+from log_config import setup_logging
+from metrics import install_sql_instrumentation, request_metrics
+from responses import FastJSONProvider, compress_response
 from werkzeug.security import generate_password_hash
-from sqlalchemy import text
 import logging
-from logging.handlers import RotatingFileHandler
+import multiprocessing
+import threading
+import time
+import uuid
 
 
 # Set up logging
-def setup_logging():
-    if getattr(sys, 'frozen', False):
-        # If running as bundled exe, log to user's app data directory
-        log_dir = os.path.join(os.getenv('APPDATA'), 'PaintStore')
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-        log_file = os.path.join(log_dir, 'backend.log')
-    else:
-        # If running in development, log to current directory
-        log_file = 'backend.log'
-
-    handler = RotatingFileHandler(log_file, maxBytes=1024 * 1024, backupCount=5)
-    handler.setFormatter(logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    ))
-
-    logger = logging.getLogger()
-    logger.addHandler(handler)
-    logger.setLevel(logging.INFO)
-    return logger
-
-
-logger = setup_logging()
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger('access')
 
 # Determine application root path
 if getattr(sys, 'frozen', False):
     # Running in a bundle (production)
     application_path = os.path.dirname(sys.executable)
-    logger.info(f"Running in bundled mode from: {application_path}")
 else:
     # Running in normal Python environment
     application_path = os.path.dirname(os.path.abspath(__file__))
-    logger.info(f"Running in development mode from: {application_path}")
 
 # Configure relative paths
 DATABASE_PATH = os.path.join(application_path, 'inventory.db')
 os.environ['DB_PATH'] = DATABASE_PATH
-logger.info(f"Database path: {DATABASE_PATH}")
-
-
-def run_migrations(engine):
-    """Run database migrations to handle schema changes"""
-    try:
-        with engine.connect() as connection:
-            # Check if buyer_name column exists
-            result = connection.execute(text("""
-                SELECT name FROM pragma_table_info('sales')
-                WHERE name='buyer_name'
-            """))
-            buyer_name_exists = result.fetchone() is not None
-
-            if not buyer_name_exists:
-                logger.info("Adding buyer_name column to sales table...")
-                connection.execute(text("""
-                    ALTER TABLE sales 
-                    ADD COLUMN buyer_name VARCHAR DEFAULT 'Unknown'
-                """))
-                connection.commit()
-                logger.info("Successfully added buyer_name column")
-            else:
-                logger.info("buyer_name column already exists")
-    except Exception as e:
-        logger.error(f"Error during migration: {str(e)}")
-        raise
-
-
-app = Flask(__name__)
-CORS(app, resources={
-    r"/api/*": {
-        "origins": ["http://localhost:3000", "file://*", "app://-", "app://.", "app://"],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
-        "expose_headers": ["Content-Type", "Authorization"],
-        "supports_credentials": True,
-        "allow_credentials": True
-    }
-})
-
-@app.after_request
-def after_request(response):
-    origin = request.headers.get('Origin', '')
-    allowed_origins = ['http://localhost:3000', 'file://', 'app://-', 'app://.', 'app://']
-    if any(origin.startswith(allowed) for allowed in allowed_origins):
-        response.headers.add('Access-Control-Allow-Origin', origin)
-        # Add these security headers
-        response.headers.add('Cross-Origin-Resource-Policy', 'cross-origin')
-        response.headers.add('Cross-Origin-Embedder-Policy', 'require-corp')
-        response.headers.add('Cross-Origin-Opener-Policy', 'same-origin')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    response.headers.add('Access-Control-Allow-Credentials', 'true')
-    return response
-
-
-# Add health check endpoint
-@app.route('/health')
-def health_check():
-    logger.info("Health check endpoint called")
-    return {'status': 'healthy'}, 200
 
 
 def initialize_database():
     try:
         logger.info(f"Initializing database at: {DATABASE_PATH}")
-        logger.info("Creating database tables...")
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully")
 
-        # Run migrations
-        logger.info("Running database migrations...")
+        # Versioned migrations; a no-op boot costs two tiny queries
         run_migrations(engine)
-        logger.info("Database migrations completed successfully")
 
         # Initialize admin user
         db = next(get_db())
@@ -160,28 +76,193 @@ def initialize_database():
         raise
 
 
-# Initialize database and run migrations
-initialize_database()
+class StartupState:
+    """Tracks background initialization so /health can report ready separately from alive"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.ready_at = None
+        self.error = None
+
+    @property
+    def ready(self):
+        return self.ready_at is not None
+
+    def run(self, initialize):
+        try:
+            initialize()
+            self.ready_at = time.perf_counter()
+            logger.info(f"Backend ready after {self.ready_at - self.started_at:.3f}s")
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Backend initialization failed: {e}")
+
+
+def create_app(background_init=True):
+    """
+    Build the Flask app. Database initialization runs on a background thread,
+    so the server accepts connections (and answers /health) straight away;
+    /api requests get 503 until it has finished. Call once per process: the
+    blueprints are module-level.
+    """
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    # /items revalidates with If-None-Match and reads back the ETag and catalog version.
+    # after_request below sets the CORS headers itself, so both use these lists.
+    cors_allow_headers = ["Content-Type", "Authorization", "If-None-Match"]
+    cors_expose_headers = ["Content-Type", "Authorization", "ETag", "X-Catalog-Version"]
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": ["http://localhost:3000", "file://*", "app://-", "app://.", "app://"],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": cors_allow_headers,
+            "expose_headers": cors_expose_headers,
+            "supports_credentials": True,
+            "allow_credentials": True
+        }
+    })
 
-# Get database session
-db = next(get_db())
+    startup = StartupState()
+    app.extensions['startup'] = startup
 
-# Register routes
-paintstore_routes = init_routes(db)
-app.register_blueprint(paintstore_routes, url_prefix='/api')
+    @app.before_request
+    def start_request():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        started = g.get('request_started')
+        elapsed = time.perf_counter() - started if started else 0.0
+        size = None if response.is_streamed else response.content_length
+        sql_statements = g.get('sql_statements', 0)
+        sql_seconds = g.get('sql_seconds', 0.0)
+        # Label by route pattern, not path, so /admin/products/<id> stays one series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_metrics.observe(
+            request.method, route, response.status_code, elapsed, size, sql_statements, sql_seconds
+        )
+        access_logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'latency_ms': round(elapsed * 1000, 2),
+            'bytes': size,
+            'sql_count': sql_statements,
+            'sql_ms': round(sql_seconds * 1000, 2),
+            # Health polls are sampled so they don't flood the log
+            'sampled': request.path == '/health' and response.status_code == 200
+        })
+        return response
+
+    @app.after_request
+    def after_request(response):
+        origin = request.headers.get('Origin', '')
+        allowed_origins = ['http://localhost:3000', 'file://', 'app://-', 'app://.', 'app://']
+        if any(origin.startswith(allowed) for allowed in allowed_origins):
+            response.headers.add('Access-Control-Allow-Origin', origin)
+            # Add these security headers
+            response.headers.add('Cross-Origin-Resource-Policy', 'cross-origin')
+            response.headers.add('Cross-Origin-Embedder-Policy', 'require-corp')
+            response.headers.add('Cross-Origin-Opener-Policy', 'same-origin')
+        response.headers.add('Access-Control-Allow-Headers', ','.join(cors_allow_headers))
+        response.headers.add('Access-Control-Expose-Headers', ','.join(cors_expose_headers))
+        response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+        response.headers.add('Access-Control-Allow-Credentials', 'true')
+        return response
+
+    # Registered last so it runs first: the access log and metrics see the bytes actually sent
+    app.after_request(compress_response)
+
+    # Add health check endpoint
+    @app.route('/health')
+    def health_check():
+        if startup.ready:
+            return {
+                'status': 'healthy',
+                'ready': True,
+                'startup_seconds': round(startup.ready_at - startup.started_at, 3)
+            }, 200
+        if startup.error:
+            return {'status': 'error', 'ready': False, 'error': startup.error}, 503
+        return {'status': 'starting', 'ready': False}, 503
+
+    @app.route('/metrics')
+    def metrics():
+        return request_metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    @app.before_request
+    def require_ready():
+        if not startup.ready and request.path.startswith('/api/') and request.method != 'OPTIONS':
+            return jsonify({'error': 'Server is starting, please retry'}), 503
+
+    install_sql_instrumentation(engine)
+
+    # Each request gets its own session from the scoped registry, torn down here
+    app.teardown_appcontext(remove_session)
+
+    # Register routes
+    paintstore_routes = init_routes(db_session)
+    app.register_blueprint(paintstore_routes, url_prefix='/api')
+
+    app.register_blueprint(init_event_routes(db_session), url_prefix='/api')
+    # Open event streams would otherwise hold up a graceful shutdown
+    app.extensions['on_shutdown'] = [broadcaster.close]
+
+    report_routes = init_report_routes(db_session)
+    app.register_blueprint(report_routes, url_prefix='/api/reports')
+
+    auth_routes, token_required = init_auth_routes(get_db)
+    app.register_blueprint(auth_routes, url_prefix='/api/auth')
+
+    backup_service = BackupService()
+    app.register_blueprint(init_backup_routes(backup_service), url_prefix='/api/admin/backups')
+    app.register_blueprint(init_archive_routes(ArchiveJob()), url_prefix='/api/admin/sales/archive')
+
+    @app.before_request
+    def require_admin():
+        # Every /api/admin/* route is admin-only; token checks are served from cache
+        if request.method != 'OPTIONS' and request.path.startswith('/api/admin/'):
+            return token_required.authenticate('admin')
+
+    # Checkpoints need the migrated schema, so they start once initialization is done
+    checkpoint_service = CheckpointService()
+
+    def initialize():
+        initialize_database()
+        checkpoint_service.start()
+
+    if background_init:
+        threading.Thread(target=startup.run, args=(initialize,), daemon=True).start()
+    else:
+        startup.run(initialize)
+
+    if backup_service.interval > 0:
+        backup_service.start()
+
+    return app
 
-auth_routes, token_required = init_auth_routes(get_db)
-app.register_blueprint(auth_routes, url_prefix='/api/auth')
 
 if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 5000))
-    debug = not getattr(sys, 'frozen', False)  # Disable debug mode in production
+    # Password hashing runs in worker processes, which a frozen build must allow
+    multiprocessing.freeze_support()
 
-    logger.info(f"Starting Flask server on port {port}")
-    logger.info(f"Debug mode: {debug}")
+    setup_logging()
+    logger.info(f"Running in {'bundled' if getattr(sys, 'frozen', False) else 'development'} mode from: {application_path}")
+    logger.info(f"Database path: {DATABASE_PATH}")
+
+    port = int(os.environ.get('PORT', 5000))
+    app = create_app()
 
     try:
-        app.run(host='127.0.0.1', port=port, debug=debug)
+        if os.environ.get('SERVER_MODE') == 'development':
+            # Werkzeug's single-process dev server with the debugger, local only
+            logger.info(f"Starting development server on port {port}")
+            app.run(host='127.0.0.1', port=port, debug=True)
+        else:
+            from serve import serve
+            serve(app, port=port)
     except Exception as e:
         logger.error(f"Failed to start server: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,170 @@
+from database import (SessionLocal, Product, StockMovement, StockCheckpoint,
+                      StockCheckpointItem, logging)
+from sqlalchemy import func, insert, literal, select, update
+from datetime import datetime, timedelta
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MOVEMENT_KINDS = ('sale', 'restock', 'adjustment', 'return')
+# How often a full stock checkpoint is taken; as-of queries replay at most
+# this much movement history on top of the nearest checkpoint. 0 turns the
+# background checkpoints off.
+STOCK_CHECKPOINT_HOURS = float(os.environ.get('STOCK_CHECKPOINT_HOURS', 24))
+
+
+def local_naive(moment):
+    """Timestamps are stored as naive Africa/Nairobi times"""
+    return moment.replace(tzinfo=None) if moment.tzinfo else moment
+
+
+def change_stock(db_session, name, delta, version):
+    """
+    Atomically add delta (negative to take stock off) to a product's stock.
+    Returns the (id, stock) row after the change, or None if the product is
+    missing or the change would take its stock below zero. The check lives in
+    the UPDATE's WHERE clause, so two tills can never oversell or overwrite
+    each other.
+    """
+    return db_session.execute(
+        update(Product)
+        .where(Product.name == name, Product.stock + delta >= 0)
+        .values(stock=Product.stock + delta, version=version)
+        .returning(Product.id, Product.stock)
+    ).one_or_none()
+
+
+def record_movements(db_session, movements):
+    """
+    Add rows to the stock ledger inside the caller's transaction, i.e. the one
+    that changed Product.stock. Each movement is a dict with product_id,
+    item_name, kind, quantity, previous_stock, new_stock, timestamp and an
+    optional note.
+    """
+    rows = [{'note': None, **movement} for movement in movements]
+    if rows:
+        db_session.execute(insert(StockMovement), rows)
+
+
+def take_checkpoint(db_session, taken_at):
+    """Record every product's current stock and commit. Returns the checkpoint."""
+    # Write first so the snapshot below is read under the write lock and no
+    # movement can commit between it and last_movement_id.
+    checkpoint = StockCheckpoint(taken_at=local_naive(taken_at), last_movement_id=0)
+    db_session.add(checkpoint)
+    db_session.flush()
+    checkpoint.last_movement_id = db_session.scalar(select(func.max(StockMovement.id))) or 0
+    db_session.execute(insert(StockCheckpointItem).from_select(
+        ['checkpoint_id', 'product_id', 'stock'],
+        select(literal(checkpoint.id), Product.id, Product.stock)
+    ))
+    db_session.commit()
+    logger.info(f"Stock checkpoint {checkpoint.id} taken through movement {checkpoint.last_movement_id}")
+    return checkpoint
+
+
+def ensure_checkpoint(db_session, now, hours=STOCK_CHECKPOINT_HOURS):
+    """Take a checkpoint if the latest one is at least `hours` old"""
+    latest = db_session.scalar(select(func.max(StockCheckpoint.taken_at)))
+    if latest is None or local_naive(now) - latest >= timedelta(hours=hours):
+        return take_checkpoint(db_session, now)
+    return None
+
+
+class CheckpointService:
+    """Takes a stock checkpoint on a background thread whenever the latest is STOCK_CHECKPOINT_HOURS old"""
+
+    def __init__(self, interval_hours=STOCK_CHECKPOINT_HOURS):
+        self.interval = interval_hours * 3600
+        self._thread = None
+        self.last_checkpoint = None
+        self.last_error = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._loop, name='stock-checkpoints', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            self.run_once()
+            # Checked at least hourly, so a checkpoint is never much later than due
+            time.sleep(min(self.interval, 3600))
+
+    def run_once(self):
+        from paintstore import eat_timezone
+        db = SessionLocal()
+        try:
+            checkpoint = ensure_checkpoint(db, datetime.now(eat_timezone()), self.interval / 3600)
+            if checkpoint is not None:
+                self.last_checkpoint = checkpoint.taken_at
+            self.last_error = None
+        except Exception as e:
+            db.rollback()
+            self.last_error = str(e)
+            logger.error(f"Stock checkpoint failed: {e}")
+        finally:
+            db.close()
+
+
+def stock_as_of(db_session, when):
+    """
+    Stock of each current product at `when`: the nearest earlier checkpoint
+    plus the movements recorded after it, up to `when`.
+    Returns a list of (id, name, stock). Raises ValueError for a time before
+    the opening checkpoint of a database that had stock before the ledger.
+    """
+    when = local_naive(when)
+    checkpoint = db_session.query(StockCheckpoint).filter(
+        StockCheckpoint.taken_at <= when
+    ).order_by(StockCheckpoint.taken_at.desc()).first()
+
+    if checkpoint is None:
+        # Before the first checkpoint everything starts from zero, unless that
+        # checkpoint is the opening balance of stock that predates the ledger.
+        first = db_session.query(StockCheckpoint).order_by(StockCheckpoint.taken_at).first()
+        if first is not None and first.last_movement_id == 0 and db_session.query(
+                StockCheckpointItem).filter_by(checkpoint_id=first.id).filter(StockCheckpointItem.stock != 0).first():
+            raise ValueError(f"Stock history starts at {first.taken_at.isoformat()}")
+        stock, after_id = {}, 0
+    else:
+        stock = dict(db_session.query(StockCheckpointItem.product_id, StockCheckpointItem.stock).filter_by(
+            checkpoint_id=checkpoint.id))
+        after_id = checkpoint.last_movement_id
+
+    changes = db_session.query(StockMovement.product_id, func.sum(StockMovement.quantity)).filter(
+        StockMovement.id > after_id, StockMovement.timestamp <= when
+    ).group_by(StockMovement.product_id)
+    for product_id, quantity in changes:
+        stock[product_id] = stock.get(product_id, 0) + quantity
+
+    return [
+        (product_id, name, stock[product_id])
+        for product_id, name in db_session.query(Product.id, Product.name).order_by(Product.name)
+        if product_id in stock
+    ]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from paintstore import eat_timezone
+    command = sys.argv[1] if len(sys.argv) > 1 else 'checkpoint'
+    db = SessionLocal()
+    try:
+        if command == 'checkpoint':
+            checkpoint = take_checkpoint(db, datetime.now(eat_timezone()))
+            print(f"Took stock checkpoint {checkpoint.id}")
+        elif command == 'as-of' and len(sys.argv) > 2:
+            for product_id, name, stock in stock_as_of(db, datetime.fromisoformat(sys.argv[2])):
+                print(f"{name}: {stock}")
+        else:
+            print("Usage: python stock.py [checkpoint|as-of <YYYY-MM-DDTHH:MM:SS>]")
+            sys.exit(2)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+    finally:
+        db.close()
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# database.py reads DB_PATH on import, so point it at a scratch file before
+# anything from the backend is imported
+_scratch = tempfile.mkdtemp(prefix='paintstore-tests-')
+os.environ['DB_PATH'] = os.path.join(_scratch, 'inventory.db')
+os.environ['BACKUP_INTERVAL_HOURS'] = '0'
+os.environ['STOCK_CHECKPOINT_HOURS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app():
+    # The blueprints are module-level, so the app is built once per test run
+    import server
+    return server.create_app(background_init=False)
+
+
+@pytest.fixture(scope='session')
+def admin_headers(app):
+    response = app.test_client().post('/api/auth/login', json={'username': 'Geets', 'password': 'geets123'})
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
@@ -0,0 +1,50 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from database import SessionLocal, Sale
+
+
+def add_sales(count, item_name):
+    db = SessionLocal()
+    db.add_all([Sale(item_name=item_name, quantity=1, buyer_name='till', timestamp=datetime.now(),
+                     previous_stock=10, new_stock=9) for _ in range(count)])
+    db.commit()
+    db.close()
+
+
+def archived_sales():
+    from archive import ARCHIVE_PATH
+    connection = sqlite3.connect(ARCHIVE_PATH)
+    try:
+        return connection.execute("SELECT id, item_name FROM sales").fetchall()
+    finally:
+        connection.close()
+
+
+def test_archiving_again_after_new_sales_loses_nothing(app):
+    from archive import archive_sales
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+
+    db = SessionLocal()
+    already_live = [tuple(row) for row in db.query(Sale.id, Sale.item_name)]
+    db.close()
+    add_sales(5, 'Archive Gloss')
+    archive_sales(tomorrow, batch_size=2, pause=0)
+
+    # The live table is empty now, so these would have reused archived ids
+    add_sales(3, 'Archive Matt')
+    db = SessionLocal()
+    second_run = [tuple(row) for row in db.query(Sale.id, Sale.item_name)]
+    db.close()
+    archive_sales(tomorrow, batch_size=2, pause=0)
+
+    archived = archived_sales()
+    assert len(archived) == len(set(archived))
+    assert set(already_live) <= set(archived)
+    assert set(second_run) <= set(archived)
+    assert [name for _, name in archived].count('Archive Gloss') == 5
+    assert [name for _, name in archived].count('Archive Matt') == 3
+
+    db = SessionLocal()
+    assert db.query(Sale).count() == 0
+    db.close()
@@ -0,0 +1,41 @@
+import datetime
+import os
+
+import jwt
+
+import auth
+
+
+def admin_request(app, token):
+    return app.test_client().get('/api/auth/users', headers={'Authorization': f'Bearer {token}'})
+
+
+def test_signing_key_is_generated_per_install(app):
+    assert auth.SECRET_KEY != 'your-secret-key'
+    assert len(auth.SECRET_KEY.encode()) >= 32
+    with open(auth.SECRET_KEY_FILE) as key_file:
+        assert key_file.read() == auth.SECRET_KEY
+    assert auth.load_secret_key() == auth.SECRET_KEY
+
+
+def test_env_key_wins(monkeypatch, tmp_path):
+    monkeypatch.setenv('JWT_SECRET_KEY', 'k' * 40)
+    assert auth.load_secret_key(str(tmp_path / 'unused.key')) == 'k' * 40
+    assert not os.path.exists(tmp_path / 'unused.key')
+
+
+def test_token_signed_with_the_old_default_key_is_rejected(app):
+    exp = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    forged = jwt.encode({'username': 'Geets', 'role': 'admin', 'exp': exp}, 'your-secret-key')
+    assert admin_request(app, forged).status_code == 401
+
+
+def test_token_without_exp_is_rejected(app):
+    token = jwt.encode({'username': 'Geets', 'role': 'admin'}, auth.SECRET_KEY)
+    response = admin_request(app, token)
+    assert response.status_code == 401
+    assert response.get_json() == {'message': 'Token is invalid'}
+
+
+def test_login_token_works(app, admin_headers):
+    assert app.test_client().get('/api/auth/users', headers=admin_headers).status_code == 200
@@ -0,0 +1,39 @@
+from catalog import CatalogCache, catalog_cache
+from database import SessionLocal
+
+
+def fresh_catalog():
+    db = SessionLocal()
+    try:
+        return list(CatalogCache().snapshot(db).products.values())
+    finally:
+        db.close()
+
+
+def test_snapshot_is_patched_not_reloaded(app, admin_headers):
+    client = app.test_client()
+    client.post('/api/admin/paint-classes', json={'name': 'Cache Gloss'}, headers=admin_headers)
+    client.post('/api/admin/paint-classes', json={'name': 'Cache Matt'}, headers=admin_headers)
+    ids = [client.post('/api/admin/products', headers=admin_headers,
+                       json={'name': f'Cache {i}', 'stock': 10, 'class': 'Cache Gloss'}).get_json()['id']
+           for i in range(3)]
+    assert client.get('/api/items').get_json() == fresh_catalog()
+    full_loads = catalog_cache.full_loads
+
+    edits = [
+        lambda: client.post('/api/sell', json={'name': 'Cache 0', 'quantity': 2, 'buyerName': 'till'}),
+        lambda: client.put(f'/api/admin/products/{ids[1]}', headers=admin_headers,
+                           json={'name': 'Cache 1 renamed', 'stock': 4, 'class': 'Cache Matt'}),
+        lambda: client.put('/api/admin/paint-classes/Cache Gloss', json={'name': 'Cache Enamel'}, headers=admin_headers),
+        lambda: client.delete(f'/api/admin/products/{ids[2]}', headers=admin_headers),
+        # May reuse the deleted id, which lands mid-catalog rather than at the end
+        lambda: client.post('/api/admin/products', headers=admin_headers,
+                            json={'name': 'Cache 3', 'stock': 1, 'class': 'Cache Matt'}),
+    ]
+    for edit in edits:
+        assert edit().status_code == 200
+        items = client.get('/api/items').get_json()
+        assert items == fresh_catalog()
+        assert [item['id'] for item in items] == sorted(item['id'] for item in items)
+    assert catalog_cache.full_loads == full_loads
+    assert client.get('/api/paint-classes').get_json()[-2:] == ['Cache Enamel', 'Cache Matt']
@@ -0,0 +1,17 @@
+ORIGIN = 'http://localhost:3000'
+
+
+def test_catalog_headers_are_exposed_to_the_frontend(app):
+    response = app.test_client().get('/api/items', headers={'Origin': ORIGIN})
+    exposed = {name.strip().lower() for name in response.headers['Access-Control-Expose-Headers'].split(',')}
+    assert response.headers['ETag'] and response.headers['X-Catalog-Version']
+    assert {'etag', 'x-catalog-version'} <= exposed
+
+
+def test_conditional_requests_pass_preflight(app):
+    response = app.test_client().options('/api/items', headers={
+        'Origin': ORIGIN,
+        'Access-Control-Request-Method': 'GET',
+        'Access-Control-Request-Headers': 'if-none-match'
+    })
+    assert 'if-none-match' in response.headers['Access-Control-Allow-Headers'].lower()
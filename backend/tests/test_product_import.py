@@ -0,0 +1,35 @@
+from database import SessionLocal, PaintClass, Product
+from product_io import IMPORT_BATCH_SIZE
+
+
+def test_unreadable_tail_reports_committed_batches(app, admin_headers):
+    db = SessionLocal()
+    db.add(PaintClass(name='Import'))
+    db.commit()
+    db.close()
+
+    # The decoder reads ahead of the CSV reader, so leave a batch of slack before the bad bytes
+    rows = ''.join(f'Import {i:05d},3,Import\n' for i in range(IMPORT_BATCH_SIZE * 2 + 10))
+    body = ('name,stock,class\n' + rows).encode() + b'Import \xff\xfe,3,Import\n'
+    response = app.test_client().post('/api/admin/products/import?format=csv', data=body, headers=admin_headers)
+
+    result = response.get_json()
+    assert response.status_code == 400
+    assert result['success'] is False
+    # Only whole batches went in, and the response counts exactly those
+    assert result['created'] in (IMPORT_BATCH_SIZE, IMPORT_BATCH_SIZE * 2) and result['updated'] == 0
+    assert result['version'] is not None
+    assert f"{result['created']} products from earlier rows were already imported" in result['message']
+
+    db = SessionLocal()
+    assert db.query(Product).filter(Product.name.like('Import %')).count() == result['created']
+    db.close()
+
+
+def test_unreadable_json_imports_nothing(app, admin_headers):
+    response = app.test_client().post('/api/admin/products/import?format=json', data=b'[{"name": "Half"',
+                                      headers=admin_headers)
+    result = response.get_json()
+    assert response.status_code == 400
+    assert result['created'] == 0 and result['version'] is None
+    assert 'already imported' not in result['message']
@@ -0,0 +1,36 @@
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import SessionLocal, Sale
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    'abc',
+    base64.urlsafe_b64encode(b'not json').decode(),
+    base64.urlsafe_b64encode(b'42').decode(),
+    base64.urlsafe_b64encode(b'["yesterday", 1]').decode(),
+    base64.urlsafe_b64encode(b'["2024-01-01T00:00:00", "x"]').decode(),
+])
+def test_malformed_cursor_is_rejected(app, cursor):
+    response = app.test_client().get('/api/sales-history', query_string={'limit': 10, 'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+
+
+def test_cursor_pages_past_the_previous_page(app):
+    db = SessionLocal()
+    now = datetime.now()
+    db.add_all([Sale(item_name='Cursor Gloss', quantity=1, buyer_name='till', timestamp=now - timedelta(minutes=minute),
+                     previous_stock=10, new_stock=9) for minute in range(3)])
+    db.commit()
+    db.close()
+
+    client = app.test_client()
+    first = client.get('/api/sales-history?limit=2').get_json()
+    second = client.get('/api/sales-history', query_string={'limit': 2, 'cursor': first['next_cursor']}).get_json()
+    assert first['next_cursor'] is not None
+    stamps = [sale['timestamp'] for sale in first['sales'] + second['sales']]
+    assert stamps == sorted(stamps, reverse=True) and len(set(stamps)) == len(stamps) >= 3
@@ -0,0 +1,9 @@
+from migrations import SALES_FILTER_CHECKS, check_sales_query_plans
+
+
+def test_keyset_page_query_is_checked():
+    assert any('cursor' in args for args in SALES_FILTER_CHECKS)
+
+
+def test_sales_filters_are_served_by_an_index(app):
+    assert check_sales_query_plans() == []
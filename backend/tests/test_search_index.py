@@ -0,0 +1,26 @@
+import search
+from catalog import catalog_cache
+
+
+def test_index_survives_sales_and_follows_renames(app, admin_headers):
+    client = app.test_client()
+    client.post('/api/admin/paint-classes', json={'name': 'Search Gloss'}, headers=admin_headers)
+    product_id = client.post('/api/admin/products', headers=admin_headers,
+                             json={'name': 'Search Ochre', 'stock': 50, 'class': 'Search Gloss'}).get_json()['id']
+    assert client.get('/api/search?q=ochre').get_json() == ['Search Ochre']
+    index = search._index
+
+    assert client.post('/api/sell', json={'name': 'Search Ochre', 'quantity': 1, 'buyerName': 'till'}).get_json()['success']
+    assert client.get('/api/search?q=ochre').get_json() == ['Search Ochre']
+    assert search._index is index
+    # Carried over from the previous snapshot, not rebuilt and compared
+    assert catalog_cache._snapshot.entries is index.entries
+
+    client.put(f'/api/admin/products/{product_id}', json={'name': 'Search Umber'}, headers=admin_headers)
+    assert client.get('/api/search?q=umber').get_json() == ['Search Umber']
+    assert search._index is not index
+
+    index = search._index
+    client.put('/api/admin/paint-classes/Search Gloss', json={'name': 'Search Satin'}, headers=admin_headers)
+    assert client.get('/api/search?q=umber&class=Search Satin').get_json() == ['Search Umber']
+    assert search._index is not index
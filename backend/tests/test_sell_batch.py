@@ -0,0 +1,85 @@
+import pytest
+
+import paintstore
+from database import SessionLocal, PaintClass, Product, Sale
+
+
+def add_product(name, stock):
+    db = SessionLocal()
+    paint_class = db.query(PaintClass).filter_by(name='Batch').first() or PaintClass(name='Batch')
+    db.add(paint_class)
+    db.flush()
+    db.add(Product(name=name, stock=stock, paint_class_id=paint_class.id))
+    db.commit()
+    db.close()
+
+
+def stock_and_sales(name):
+    db = SessionLocal()
+    try:
+        stock = db.query(Product.stock).filter_by(name=name).scalar()
+        sales = db.query(Sale.quantity, Sale.previous_stock, Sale.new_stock).filter_by(
+            item_name=name).order_by(Sale.id).all()
+        return stock, [tuple(sale) for sale in sales]
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize('body', [
+    [],
+    'cart',
+    {'items': 'Batch Gloss', 'buyerName': 'till'},
+    {'items': ['Batch Gloss'], 'buyerName': 'till'},
+    {'items': [{'name': ['a'], 'quantity': 1}], 'buyerName': 'till'},
+    {'items': [{'quantity': 1}], 'buyerName': 'till'},
+    {'items': [{'name': 'Batch Gloss', 'quantity': 1}], 'buyerName': ['till']},
+])
+def test_malformed_cart_is_a_bad_request(app, body):
+    response = app.test_client().post('/api/sell/batch', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_repeated_lines_chain_stock(app):
+    add_product('Batch Chain', 10)
+    response = app.test_client().post('/api/sell/batch', json={
+        'buyerName': 'till', 'items': [{'name': 'Batch Chain', 'quantity': 3}, {'name': 'Batch Chain', 'quantity': 4}]
+    })
+    assert response.get_json()['success'] is True
+    assert stock_and_sales('Batch Chain') == (3, [(3, 10, 7), (4, 7, 3)])
+
+
+def test_repeated_lines_past_the_stock_sell_nothing(app):
+    add_product('Batch Short', 10)
+    response = app.test_client().post('/api/sell/batch', json={
+        'buyerName': 'till', 'items': [{'name': 'Batch Short', 'quantity': 6}, {'name': 'Batch Short', 'quantity': 5}]
+    })
+    result = response.get_json()
+    assert result['success'] is False
+    assert result['rejected'] == [{'index': 1, 'name': 'Batch Short', 'message': "Not enough stock!"}]
+    assert stock_and_sales('Batch Short') == (10, [])
+
+
+def test_stale_snapshot_is_rejected_by_the_update(app, monkeypatch):
+    add_product('Batch Stale', 5)
+    add_product('Batch Other', 5)
+    claim_version = paintstore.next_catalog_version
+
+    def another_till_sells_first(db_session):
+        # Runs after the cart was checked against its snapshot, before any stock is taken
+        db = SessionLocal()
+        db.query(Product).filter_by(name='Batch Stale').update({'stock': 1})
+        db.commit()
+        db.close()
+        return claim_version(db_session)
+
+    monkeypatch.setattr(paintstore, 'next_catalog_version', another_till_sells_first)
+    response = app.test_client().post('/api/sell/batch', json={
+        'buyerName': 'till', 'items': [{'name': 'Batch Other', 'quantity': 2}, {'name': 'Batch Stale', 'quantity': 3}]
+    })
+    result = response.get_json()
+    assert result['success'] is False
+    assert result['rejected'] == [{'index': 1, 'name': 'Batch Stale', 'message': "Not enough stock!"}]
+    # The other line's UPDATE was rolled back with the rest of the cart
+    assert stock_and_sales('Batch Stale') == (1, [])
+    assert stock_and_sales('Batch Other') == (5, [])
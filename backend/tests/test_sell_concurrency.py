@@ -0,0 +1,73 @@
+import random
+import threading
+
+from sqlalchemy import func
+
+from database import SessionLocal, Product, PaintClass, Sale, DailySalesRollup, StockMovement
+
+THREADS = 16
+SELLS_PER_THREAD = 25
+OPENING_STOCK = 150
+PRODUCTS = ['Stress Gloss', 'Stress Matt', 'Stress Primer', 'Stress Enamel']
+
+
+def test_parallel_sells_reconcile(app):
+    db = SessionLocal()
+    paint_class = PaintClass(name='Stress')
+    db.add(paint_class)
+    db.flush()
+    db.add_all([Product(name=name, stock=OPENING_STOCK, paint_class_id=paint_class.id) for name in PRODUCTS])
+    db.commit()
+
+    results = []
+    lock = threading.Lock()
+    start = threading.Barrier(THREADS)
+
+    def seller(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        start.wait()
+        for _ in range(SELLS_PER_THREAD):
+            name = rng.choice(PRODUCTS)
+            quantity = rng.randint(1, 3)
+            response = client.post('/api/sell', json={'name': name, 'quantity': quantity, 'buyerName': f'till {seed}'})
+            with lock:
+                results.append((name, quantity, response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=seller, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == THREADS * SELLS_PER_THREAD
+    assert all(status == 200 for _, _, status, _ in results)
+    # 16 x 25 sells of up to 3 units can't all fit in the stock, so some must be refused
+    refused = [body for _, _, _, body in results if not body['success']]
+    assert refused and all(body['message'] == 'Not enough stock!' for body in refused)
+
+    sold = {name: 0 for name in PRODUCTS}
+    for name, quantity, _, body in results:
+        if body['success']:
+            sold[name] += quantity
+
+    db.expire_all()
+    for name in PRODUCTS:
+        stock = db.query(Product.stock).filter_by(name=name).scalar()
+        sales_total = db.query(func.sum(Sale.quantity)).filter_by(item_name=name).scalar() or 0
+        rollup_total = db.query(func.sum(DailySalesRollup.quantity)).filter_by(item_name=name).scalar() or 0
+        ledger_total = db.query(func.sum(StockMovement.quantity)).filter_by(item_name=name, kind='sale').scalar() or 0
+
+        assert stock >= 0
+        assert OPENING_STOCK - stock == sold[name] == sales_total == rollup_total == -ledger_total
+
+        # Every sale saw the stock left by the one before it: no lost updates
+        chain = db.query(Sale.previous_stock, Sale.quantity, Sale.new_stock).filter_by(item_name=name).order_by(
+            Sale.previous_stock.desc()
+        ).all()
+        expected = OPENING_STOCK
+        for previous_stock, quantity, new_stock in chain:
+            assert previous_stock == expected
+            assert new_stock == previous_stock - quantity
+            expected = new_stock
+    db.close()
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from sqlalchemy import func
+
+from database import SessionLocal, StockCheckpoint
+from stock import CheckpointService
+
+
+def checkpoint_count():
+    db = SessionLocal()
+    try:
+        return db.query(func.count(StockCheckpoint.id)).scalar()
+    finally:
+        db.close()
+
+
+def age_checkpoints(hours):
+    db = SessionLocal()
+    for checkpoint in db.query(StockCheckpoint):
+        checkpoint.taken_at -= timedelta(hours=hours)
+    db.commit()
+    db.close()
+
+
+def test_service_checkpoints_when_the_latest_is_due(app):
+    service = CheckpointService(interval_hours=24)
+    service.run_once()
+    taken = checkpoint_count()
+    assert taken >= 1 and service.last_error is None
+
+    service.run_once()
+    assert checkpoint_count() == taken
+
+    age_checkpoints(25)
+    service.run_once()
+    assert checkpoint_count() == taken + 1
+    assert service.last_checkpoint is not None
+
+
+def test_stock_as_of_only_reads(app, admin_headers):
+    age_checkpoints(48)
+    before = checkpoint_count()
+    response = app.test_client().get('/api/admin/stock?as_of=2030-01-01T00:00:00', headers=admin_headers)
+    assert response.status_code == 200
+    assert checkpoint_count() == before
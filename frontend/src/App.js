@@ -48,7 +48,6 @@ function App() {
   const handleLogin = (role) => {
     setIsAuthenticated(true);
     setUserRole(role);
-    localStorage.setItem('token', 'some-token'); // You should use a real token
     localStorage.setItem('role', role);
   };
 
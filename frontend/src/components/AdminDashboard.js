@@ -100,7 +100,10 @@ const AdminDashboard = () => {
     try {
       const response = await fetch(`${config.apiUrl}/api/admin/paint-classes`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('token')}`
+        },
         body: JSON.stringify({ name: newClassName.trim() })
       });
 
@@ -142,7 +145,10 @@ const AdminDashboard = () => {
     try {
       const response = await fetch(`${config.apiUrl}/api/admin/products`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('token')}`
+        },
         body: JSON.stringify({
           name: combinedName,
           stock: parseInt(newProduct.stock),
@@ -182,7 +188,10 @@ const AdminDashboard = () => {
     try {
       const response = await fetch(`${config.apiUrl}/api/admin/products/${editingProduct.id}`, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('token')}`
+        },
         body: JSON.stringify(editingProduct)
       });
       if (!response.ok) throw new Error('Failed to update product');
@@ -200,7 +209,8 @@ const AdminDashboard = () => {
     if (window.confirm('Are you sure you want to delete this product?')) {
       try {
         const response = await fetch(`${config.apiUrl}/api/admin/products/${productId}`, {
-          method: 'DELETE'
+          method: 'DELETE',
+          headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
         });
         if (!response.ok) throw new Error('Failed to delete product');
         fetchProducts();
@@ -226,7 +236,10 @@ const AdminDashboard = () => {
     try {
       const response = await fetch(`${config.apiUrl}/api/admin/paint-classes`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('token')}`
+        },
         body: JSON.stringify({ name: localNewClassName.trim() })
       });
 
@@ -253,7 +266,10 @@ const AdminDashboard = () => {
     try {
       const response = await fetch(`${config.apiUrl}/api/admin/paint-classes/${encodeURIComponent(originalName)}`, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('token')}`
+        },
         body: JSON.stringify({ name: editingValue.trim() })
       });
 
@@ -286,7 +302,8 @@ const AdminDashboard = () => {
     if (window.confirm(`Are you sure you want to delete the paint class "${className}"?`)) {
       try {
         const response = await fetch(`${config.apiUrl}/api/admin/paint-classes/${encodeURIComponent(className)}`, {
-          method: 'DELETE'
+          method: 'DELETE',
+          headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
         });
 
         if (!response.ok) {
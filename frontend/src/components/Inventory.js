@@ -19,6 +19,24 @@ const InventoryTable = () => {
     fetchInventory();
   }, []);
 
+  // Live stock updates from other tills; EventSource reconnects and resumes on its own
+  useEffect(() => {
+    const events = new EventSource(`${config.apiUrl}/api/events`);
+    events.addEventListener('stock', (event) => {
+      const { items } = JSON.parse(event.data);
+      const stockById = new Map(items.map((item) => [item.id, item.stock]));
+      setInventory((current) =>
+        current.map((item) =>
+          stockById.has(item.id) ? { ...item, stock: stockById.get(item.id) } : item
+        )
+      );
+    });
+    ['product', 'product_deleted', 'paint_class', 'catalog', 'changes'].forEach((type) =>
+      events.addEventListener(type, () => fetchInventory())
+    );
+    return () => events.close();
+  }, []);
+
   // New debounced search effect
   useEffect(() => {
     const timeoutId = setTimeout(() => {